@@ -1,35 +1,61 @@
 import os
 import json
+import uuid
+import asyncio
 import logging
-import httpx
 from pathlib import Path
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
+from audio_processing import preprocess_voice, EmptyAudioError
+from speech_to_text import create_stt_backend
+from speech_synthesis import create_tts_backend
+from llm_providers import create_llm_router, DeadlineExceeded
+from network_clients import build_openai_http_client, build_openai_async_http_client
+from circuit_breaker import CircuitOpenError, chat_breaker, transcription_breaker, speech_breaker
 from config import OpenAIkey, http_proxy, https_proxy
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
-# Настройка HTTP прокси
+# Настройка HTTP клиентов (прокси, HTTP/2, keep-alive)
 client = OpenAI(
     api_key=OpenAIkey,
     base_url="https://api.openai.com/v1",
-    http_client=httpx.Client(
-        transport=httpx.HTTPTransport(
-            proxy=http_proxy or https_proxy,
-            local_address="0.0.0.0"
-        ) if (http_proxy or https_proxy) else None
-    )
+    http_client=build_openai_http_client(http_proxy or https_proxy)
 )
+# Асинхронный клиент для чат-запросов: позволяет отменять дублирующие запросы
+async_client = AsyncOpenAI(
+    api_key=OpenAIkey,
+    base_url="https://api.openai.com/v1",
+    http_client=build_openai_async_http_client(http_proxy or https_proxy)
+)
+
+# Движок распознавания речи (OpenAI Whisper API или локальная модель).
+# Запросы идут в потоках, и таймаут предохранителя лишь прекращает ожидание,
+# поэтому сам HTTP-запрос ограничен тем же таймаутом и не повторяется
+stt_backend = create_stt_backend(
+    client.with_options(timeout=transcription_breaker.call_timeout, max_retries=0)
+)
+# Движок синтеза речи (OpenAI TTS или локальные голоса)
+tts_backend = create_tts_backend(
+    client.with_options(timeout=speech_breaker.call_timeout, max_retries=0)
+)
+# Маршрутизация запросов к LLM по уровню сложности
+llm_router = create_llm_router(async_client)
 
 
-async def process_voice_message(voice_file) -> str:
-    """Обработка голосового сообщения с помощью Whisper API"""
+async def process_voice_message(voice_file, deadline: float = None) -> str:
+    """Обработка голосового сообщения с помощью движка распознавания речи.
+
+    deadline - момент (по часам цикла событий), к которому должен быть готов
+    весь ход; распознавание не может занять больше оставшегося времени.
+    """
     # Создание временной директории, если она не существует
     temp_dir = Path("temp")
     temp_dir.mkdir(exist_ok=True)
     
-    file_path = temp_dir / "temp_voice.ogg"
+    file_path = temp_dir / f"temp_voice_{uuid.uuid4().hex}.ogg"
+    prepared_path = None
     try:
         # Загрузка голосового файла
         logger.info("Загрузка голосового файла...")
@@ -38,38 +64,65 @@ async def process_voice_message(voice_file) -> str:
         
         if not file_path.exists():
             raise FileNotFoundError(f"Голосовой файл не найден: {file_path}")
-            
-        logger.info("Начало транскрипции через Whisper API...")
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
-            if not transcript:
-                raise ValueError("Получена пустая транскрипция от Whisper API")
-                
-            logger.info("Транскрипция голоса успешно завершена")
-            logger.debug(f"Транскрибированный текст: {transcript[:100]}...")  # Логируем первые 100 символов
-            return transcript
+
+        # Предобработка: обрезка тишины и понижение частоты дискретизации
+        upload_path = file_path
+        try:
+            prepared = await asyncio.to_thread(preprocess_voice, file_path)
+            prepared_path = prepared.path
+            logger.info(f"Предобработка голосового файла: {prepared.summary()}")
+            if prepared.reduced:
+                upload_path = prepared.path
+        except EmptyAudioError:
+            raise
+        except Exception as e:
+            logger.warning(f"Не удалось выполнить предобработку, отправляем исходный файл: {str(e)}")
+
+        logger.info(f"Начало транскрипции (движок: {stt_backend.name})...")
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                raise DeadlineExceeded("Бюджет времени на ход исчерпан до транскрипции")
+        transcript = await transcription_breaker.call(
+            lambda: stt_backend.transcribe(upload_path), timeout=timeout
+        )
+        if not transcript:
+            raise ValueError("Получена пустая транскрипция")
+
+        logger.info("Транскрипция голоса успешно завершена")
+        logger.debug(f"Транскрибированный текст: {transcript[:100]}...")  # Логируем первые 100 символов
+        return transcript
             
     except FileNotFoundError as e:
         logger.error(f"Ошибка файла: {str(e)}")
         raise Exception("Не удалось получить доступ к голосовому файлу")
+    except EmptyAudioError as e:
+        logger.info(f"Голосовое сообщение отклонено до транскрипции: {str(e)}")
+        raise
+    except CircuitOpenError as e:
+        logger.warning(f"Транскрипция пропущена: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Ошибка обработки голосового сообщения: {str(e)}")
         raise Exception(f"Не удалось обработать голосовое сообщение: {str(e)}")
     finally:
-        # Очистка временного файла
+        # Очистка временных файлов
         try:
-            if file_path.exists():
-                file_path.unlink()
-                logger.debug(f"Временный голосовой файл удален: {file_path}")
+            for path in (file_path, prepared_path):
+                if path and path.exists():
+                    path.unlink()
+                    logger.debug(f"Временный голосовой файл удален: {path}")
         except Exception as e:
             logger.warning(f"Не удалось удалить временный файл: {str(e)}")
 
-async def generate_response(text: str, user_id: int, conversation_context: dict = None) -> str:
-    """Генерация ответа с помощью GPT-4"""
+async def generate_response(text: str, user_id: int, conversation_context: dict = None,
+                            deadline: float = None) -> str:
+    """Генерация ответа пациента с помощью LLM, выбранной по уровню сложности.
+
+    deadline - момент (по часам цикла событий), к которому ответ должен быть
+    готов; после него возвращается заготовленный ответ.
+    """
     try:
         system_content = (
             "You are a patient talking to a doctor during a medical consultation. "
@@ -99,20 +152,46 @@ async def generate_response(text: str, user_id: int, conversation_context: dict
             
             system_content += " Stay in character and provide consistent responses based on these symptoms."
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_content
-                },
-                {"role": "user", "content": text}
-            ],
-            max_tokens=150
+        messages = [
+            {
+                "role": "system",
+                "content": system_content
+            },
+            {"role": "user", "content": text}
+        ]
+        difficulty = conversation_context.get('difficulty') if conversation_context else None
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                raise DeadlineExceeded("Бюджет времени на ход исчерпан до запроса к LLM")
+        return await chat_breaker.call(
+            lambda: llm_router.complete(messages, difficulty, max_tokens=150, deadline=deadline),
+            timeout=timeout
         )
-        return response.choices[0].message.content
     except Exception as e:
-        return f"Error generating response: {str(e)}"
+        logger.error(f"Ошибка генерации ответа, используется заготовленный ответ: {str(e)}")
+        return canned_response(conversation_context)
+
+# Пометка заготовленного ответа: пользователь должен видеть, что сервис деградировал
+DEGRADED_NOTE = "⚠️ The virtual patient is temporarily unavailable, this is an automatic reply."
+
+def canned_response(conversation_context: dict = None) -> str:
+    """Заготовленный ответ пациента на случай недоступности LLM.
+
+    Содержит только исходную жалобу: симптомы сценария студент должен
+    выяснить сам, поэтому заготовка их не раскрывает.
+    """
+    if conversation_context and 'scenario' in conversation_context:
+        complaint = conversation_context['scenario']['initial_complaint']
+        response = f"Sorry, doctor, I'm a bit confused. As I said, {complaint} Could you rephrase the question?"
+    else:
+        response = "Sorry, doctor, could you repeat the question?"
+    return f"{response}\n\n{DEGRADED_NOTE}"
+
+def is_degraded_reply(response: str) -> bool:
+    """Ответ заготовлен, а не сгенерирован моделью"""
+    return response.endswith(DEGRADED_NOTE)
 
 async def text_to_speech(text: str, conversation_context: dict = None) -> bytes:
     """Convert text to speech with gender-appropriate voice"""
@@ -126,48 +205,17 @@ async def text_to_speech(text: str, conversation_context: dict = None) -> bytes:
             text = text[:4096]  # Лимит Telegram для голосовых сообщений
             logger.info(f"Text truncated to {len(text)} characters")
             
-        logger.info("Making API request to OpenAI TTS...")
+        # Выбор голоса в зависимости от пола пациента
+        if conversation_context and 'scenario' in conversation_context:
+            gender = conversation_context['scenario'].get('patient_gender', 'neutral')
+            logger.info(f"Selecting voice for gender: {gender}")
+        else:
+            gender = 'neutral'  # По умолчанию нейтральный голос, если контекст отсутствует
+            logger.info("No context provided, using default neutral voice")
+
+        logger.info(f"Making speech synthesis request (backend: {tts_backend.name})...")
         try:
-            # Выбор голоса в зависимости от пола пациента с четким разделением по полу
-            if conversation_context and 'scenario' in conversation_context:
-                gender = conversation_context['scenario'].get('patient_gender', 'neutral')
-                logger.info(f"Selecting voice for gender: {gender}")
-                
-                # Определение голосов с основными вариантами для каждого пола
-                female_voice = 'nova'     # Женский голос
-                male_voice = 'echo'       # Мужской голос
-                neutral_voice = 'alloy'   # Нейтральный голос
-                
-                if gender == 'female':
-                    voice = female_voice
-                    logger.info("Using female voice: nova")
-                elif gender == 'male':
-                    voice = male_voice
-                    logger.info("Using male voice: echo")
-                else:  # neutral
-                    voice = neutral_voice
-                    logger.info("Using neutral voice: alloy")
-            else:
-                voice = 'alloy'  # По умолчанию нейтральный голос, если контекст отсутствует
-                logger.info("No context provided, using default neutral voice: alloy")
-            
-            logger.info(f"Using voice: {voice} for gender: {gender if conversation_context else 'unknown'}")
-            
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text,
-                response_format="opus",  # Используем формат opus, который лучше поддерживается
-                speed=1.0
-            )
-            
-            if not response:
-                raise ValueError("No response received from TTS API")
-                
-            if not hasattr(response, 'content'):
-                raise ValueError("Invalid response format from TTS API")
-                
-            content = response.content
+            content = await speech_breaker.call(lambda: tts_backend.synthesize(text, gender))
             if not isinstance(content, bytes):
                 raise ValueError(f"Unexpected content type: {type(content)}")
                 
@@ -181,8 +229,8 @@ async def text_to_speech(text: str, conversation_context: dict = None) -> bytes:
             return content
             
         except Exception as api_error:
-            logger.error(f"OpenAI API error: {str(api_error)}")
-            raise ValueError(f"TTS API error: {str(api_error)}")
+            logger.error(f"Speech synthesis error: {str(api_error)}")
+            raise ValueError(f"TTS error: {str(api_error)}")
             
     except Exception as e:
         logger.error(f"Error in text-to-speech conversion: {str(e)}")
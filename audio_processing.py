@@ -0,0 +1,105 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+from pydub import AudioSegment
+from pydub.silence import detect_leading_silence
+
+logger = logging.getLogger(__name__)
+
+# Whisper внутренне работает с моно-сигналом 16 кГц
+TARGET_FRAME_RATE = 16000
+TARGET_CHANNELS = 1
+TARGET_BITRATE = "24k"
+# Порог тишины относительно громкости записи и минимальная длительность речи
+SILENCE_THRESHOLD_DB = -16.0
+MIN_SILENCE_THRESHOLD_DBFS = -50.0
+MIN_SPEECH_MS = 500
+# Сколько тишины оставлять по краям, чтобы не обрезать начало и конец слов
+PADDING_MS = 150
+
+
+class EmptyAudioError(ValueError):
+    """Голосовое сообщение не содержит речи или слишком короткое"""
+
+
+@dataclass
+class PreprocessResult:
+    """Результат предобработки голосового сообщения"""
+    path: Path
+    original_bytes: int
+    processed_bytes: int
+    original_ms: int
+    processed_ms: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.processed_bytes
+
+    @property
+    def seconds_saved(self) -> float:
+        return (self.original_ms - self.processed_ms) / 1000
+
+    @property
+    def reduced(self) -> bool:
+        """Запись стала короче или меньше; Whisper тарифицирует по длительности"""
+        return self.processed_ms < self.original_ms or self.processed_bytes < self.original_bytes
+
+    def summary(self) -> str:
+        return (
+            f"{self.original_bytes} -> {self.processed_bytes} байт, "
+            f"{self.original_ms / 1000:.2f} -> {self.processed_ms / 1000:.2f} с "
+            f"(сэкономлено {self.bytes_saved} байт, {self.seconds_saved:.2f} с)"
+        )
+
+
+def _silence_threshold(audio: AudioSegment) -> float:
+    """Порог тишины, привязанный к средней громкости записи"""
+    return max(audio.dBFS + SILENCE_THRESHOLD_DB, MIN_SILENCE_THRESHOLD_DBFS)
+
+
+def trim_silence(audio: AudioSegment) -> AudioSegment:
+    """Обрезка тишины в начале и в конце записи"""
+    threshold = _silence_threshold(audio)
+    start = detect_leading_silence(audio, silence_threshold=threshold)
+    end = detect_leading_silence(audio.reverse(), silence_threshold=threshold)
+    start = max(0, start - PADDING_MS)
+    end = min(len(audio), len(audio) - end + PADDING_MS)
+    if end <= start:
+        return audio[:0]
+    return audio[start:end]
+
+
+def preprocess_voice(source: Path) -> PreprocessResult:
+    """Подготовка голосового сообщения к отправке в Whisper.
+
+    Декодирует запись, обрезает тишину по краям, сводит в моно 16 кГц и
+    перекодирует в opus с низким битрейтом. Пустые и слишком короткие
+    записи отклоняются до обращения к API.
+    """
+    source = Path(source)
+    original_bytes = source.stat().st_size
+    audio = AudioSegment.from_file(source)
+    original_ms = len(audio)
+
+    if audio.dBFS == float('-inf'):
+        raise EmptyAudioError("Голосовое сообщение не содержит звука")
+
+    audio = trim_silence(audio)
+    if len(audio) < MIN_SPEECH_MS:
+        raise EmptyAudioError(
+            f"Голосовое сообщение слишком короткое ({len(audio)} мс речи)"
+        )
+
+    audio = audio.set_channels(TARGET_CHANNELS).set_frame_rate(TARGET_FRAME_RATE)
+
+    target = source.with_name(f"{source.stem}_prepared.ogg")
+    audio.export(target, format="ogg", codec="libopus", bitrate=TARGET_BITRATE)
+
+    return PreprocessResult(
+        path=target,
+        original_bytes=original_bytes,
+        processed_bytes=target.stat().st_size,
+        original_ms=original_ms,
+        processed_ms=len(audio),
+    )
@@ -14,17 +14,31 @@ from telegram.ext import (
 )
 from dialog_manager import ConversationManager
 from database import User, Session, db_session
-from ai_integration import process_voice_message, generate_response, text_to_speech
+from ai_integration import process_voice_message, generate_response, text_to_speech, is_degraded_reply, stt_backend, tts_backend, llm_router
+from ai_integration import client, async_client
+from audio_processing import EmptyAudioError
+from transcript_archive import transcript_archive
+from network_clients import build_telegram_request, keep_warm, get_connection_stats
+from circuit_breaker import CircuitOpenError, transcription_breaker, speech_breaker, get_health
+from loop_monitor import LoopLagMonitor
+from message_scheduler import OutboundScheduler, REPLY
 from config import TelegramToken
 
 logger = logging.getLogger(__name__)
 
+# Бюджет времени (секунды) на ответ пациента в одном ходе диалога
+TURN_LATENCY_BUDGET = float(os.environ.get('TURN_LATENCY_BUDGET', 20))
+# Интервал (секунды) прогрева соединений при простое; 0 - отключить
+KEEPWARM_INTERVAL = float(os.environ.get('NET_KEEPWARM_INTERVAL', 60))
+
 def get_start_dialogue_markup():
     """Helper function to create Start Dialogue button markup"""
     keyboard = [[InlineKeyboardButton("Start Dialogue", callback_data='start_dialogue')]]
     return InlineKeyboardMarkup(keyboard)
 
 conversation_manager = ConversationManager()
+loop_monitor = LoopLagMonitor.from_env()
+outbound = OutboundScheduler.from_env()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -174,6 +188,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
+    # Дедлайн хода включает распознавание речи и генерацию ответа
+    deadline = asyncio.get_running_loop().time() + TURN_LATENCY_BUDGET
     
     try:
         if not conversation_manager.is_conversation_active(user_id):
@@ -200,7 +216,21 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("Voice message not detected. Please try again.")
             return
             
-        processing_msg = await update.message.reply_text("Processing your voice message and generating response...")
+        if transcription_breaker.is_open:
+            await update.message.reply_text(
+                "Voice recognition is temporarily unavailable. Please type your question instead."
+            )
+            return
+
+        chat_id = update.effective_chat.id
+        processing_msg = await outbound.send_text(
+            context.bot, chat_id, "Processing your voice message and generating response..."
+        )
+        response = None
+        reply_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("Make Diagnosis", callback_data='make_diagnosis')],
+            [InlineKeyboardButton("Show Transcription", callback_data='show_transcription')]
+        ])
         
         try:
             logger.info("Retrieving voice file from Telegram...")
@@ -209,8 +239,24 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 raise ValueError("Failed to retrieve voice file")
             logger.info("Voice file retrieved successfully")
             
-            logger.info("Starting transcription with Whisper API...")
-            text = await process_voice_message(file)
+            logger.info("Starting voice transcription...")
+            try:
+                text = await process_voice_message(file, deadline=deadline)
+            except EmptyAudioError as e:
+                logger.info(f"Voice message from user {user_id} rejected: {str(e)}")
+                await outbound.edit_text(
+                    processing_msg,
+                    "Your voice message seems to be empty or too short. Please try again.",
+                    priority=REPLY
+                )
+                return
+            except CircuitOpenError:
+                await outbound.edit_text(
+                    processing_msg,
+                    "Voice recognition is temporarily unavailable. Please type your question instead.",
+                    priority=REPLY
+                )
+                return
             if not text:
                 raise ValueError("Failed to transcribe voice message")
             logger.info("Voice transcription completed successfully")
@@ -224,10 +270,17 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except Exception as e:
                 logger.error(f"Error tracking voice question: {str(e)}")
             
-            response = await generate_response(text, user_id, conv_context)
+            response = await generate_response(text, user_id, conv_context, deadline=deadline)
+            conversation_manager.add_response(user_id, response)
             logger.info("GPT response generated successfully")
             
             context.user_data['bot_response'] = response
+
+            if speech_breaker.is_open or is_degraded_reply(response):
+                # Синтез речи недоступен или ответ заготовлен - отвечаем текстом с пометкой
+                logger.info("Speech synthesis unavailable or reply degraded, replying with text")
+                await outbound.edit_text(processing_msg, response, reply_markup=reply_markup, priority=REPLY)
+                return
             
             logger.info("Starting voice response generation...")
             audio_content = await text_to_speech(response, conv_context)
@@ -267,13 +320,11 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 with open(voice_file, "rb") as f:
                     try:
-                        await context.bot.send_voice(
-                            chat_id=update.effective_chat.id,
-                            voice=f,
-                            reply_markup=InlineKeyboardMarkup([
-                                [InlineKeyboardButton("Make Diagnosis", callback_data='make_diagnosis')],
-                                [InlineKeyboardButton("Show Transcription", callback_data='show_transcription')]
-                            ])
+                        await outbound.send_voice(
+                            context.bot,
+                            chat_id,
+                            f,
+                            reply_markup=reply_markup
                         )
                         logger.info("Voice message sent successfully")
                     except Exception as telegram_error:
@@ -293,30 +344,30 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
             logger.info("Voice response sent successfully")
             
-            try:
-                await processing_msg.delete()
-                logger.debug("Processing message deleted successfully")
-            except Exception as e:
-                logger.warning(f"Could not delete processing message: {str(e)}")
+            # Удаление служебного сообщения не задерживает ответы
+            outbound.delete(processing_msg)
             
         except Exception as voice_error:
             logger.error(f"Error generating voice response: {str(voice_error)}")
             logger.error("Full error details:", exc_info=True)
             
-            keyboard = [
-                [InlineKeyboardButton("Make Diagnosis", callback_data='make_diagnosis')],
-                [InlineKeyboardButton("Show Transcription", callback_data='show_transcription')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            if response:
+                fallback_text = f"Voice generation failed. Here is the text response:\n\n{response}"
+                fallback_markup = reply_markup
+            else:
+                fallback_text = "Sorry, your voice message could not be processed. Please try again or use text input."
+                fallback_markup = None
             
             try:
-                await processing_msg.edit_text(
-                    "Voice generation failed. Sending text response instead.",
-                    reply_markup=reply_markup
+                await outbound.edit_text(
+                    processing_msg,
+                    fallback_text,
+                    reply_markup=fallback_markup,
+                    priority=REPLY
                 )
             except Exception as e:
                 logger.warning(f"Could not update processing message: {str(e)}")
-                await update.message.reply_text(response, reply_markup=reply_markup)
+                await outbound.send_text(context.bot, chat_id, fallback_text, reply_markup=fallback_markup)
         
     except ValueError as ve:
         logger.error(f"Validation error in voice processing: {str(ve)}")
@@ -352,20 +403,10 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         scenario = conv_context['scenario']
         correct_diagnosis = scenario['correct_diagnosis']
         
-        try:
-            with db_session() as session:
-                user = session.query(User).filter_by(telegram_id=user_id).first()
-                questions_list = conv_context.get('questions_asked', [])
-                questions_asked = len(questions_list)
-                logger.info(f"Questions asked by user {user_id}: {questions_asked}")
-                logger.debug(f"Questions list: {questions_list}")
-                
-                recommended_questions = set(scenario.get('hints', []))
-                asked_questions = set(questions_list)
-                missed_questions = recommended_questions - asked_questions if recommended_questions else set()
-        except Exception as e:
-            logger.error(f"Database error in handle_text (diagnosis feedback): {e}")
-            return
+        questions_asked = len(conv_context.get('questions_asked', []))
+        logger.info(f"Questions asked by user {user_id}: {questions_asked}")
+        # Покрытие подсказок отслеживается по мере поступления вопросов
+        missed_questions = conversation_manager.get_missed_hints(user_id)
 
 
         from dialog_manager import string_similarity
@@ -449,19 +490,23 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             feedback += "\n".join(f"• {q}" for q in missed_questions)
         
         try:
-            await update.message.reply_text(feedback)
-            if 'medical_terms' in scenario and scenario['medical_terms']:
-                terms_message = "📚 Медицинские термины по данному случаю:\n\n"
-                for term, translations in scenario['medical_terms'].items():
-                    terms_message += f"• {translations['en']} - {translations['ru']}\n"
-                await update.message.reply_text(terms_message)
-            conversation_manager.end_conversation(user_id)
+            # Сообщения ставятся в очередь подряд и объединяются в одно
+            chat_id = update.effective_chat.id
+            outbound.send_text(context.bot, chat_id, feedback)
+            terms_message = conversation_manager.get_glossary(user_id)
+            if terms_message:
+                outbound.send_text(context.bot, chat_id, terms_message)
             keyboard = [[InlineKeyboardButton("Start New Dialogue", callback_data='start_dialogue')]]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(
+            delivered = outbound.send_text(
+                context.bot,
+                chat_id,
                 "The consultation is complete. Would you like to start a new dialogue?",
                 reply_markup=reply_markup
             )
+            conversation_manager.record_diagnosis(user_id, diagnosis, is_exact_match or is_close_match)
+            conversation_manager.end_conversation(user_id)
+            await delivered
         except Exception as e:
             logger.error(f"Error processing diagnosis feedback: {str(e)}")
             await update.message.reply_text(
@@ -472,7 +517,9 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         conversation_manager.add_question(user_id, update.message.text)
         logger.info(f"Added text question from user {user_id}: {update.message.text[:50]}...")
-        response = await generate_response(update.message.text, user_id, conv_context)
+        deadline = asyncio.get_running_loop().time() + TURN_LATENCY_BUDGET
+        response = await generate_response(update.message.text, user_id, conv_context, deadline=deadline)
+        conversation_manager.add_response(user_id, response)
     except Exception as e:
         logger.error(f"Error processing text message: {str(e)}")
         response = "Sorry, there was an error processing your message. Please try again."
@@ -480,11 +527,56 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[InlineKeyboardButton("Make Diagnosis", callback_data='make_diagnosis')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(response, reply_markup=reply_markup)
+    await outbound.send_text(context.bot, update.effective_chat.id, response, reply_markup=reply_markup)
+
+async def on_startup(application: Application):
+    """Start background services once the event loop is running"""
+    await loop_monitor.start()
+    # Прогрев идёт в фоне: недоступный API не должен задерживать запуск бота
+    application.bot_data['keep_warm_task'] = asyncio.create_task(
+        keep_warm(KEEPWARM_INTERVAL, client, async_client, application.bot)
+    )
+    # В шарде загружается история только его пользователей (см. sharded_runner)
+    await asyncio.to_thread(conversation_manager.load_history, application.bot_data.get('owns_user'))
+    await stt_backend.start()
+    await tts_backend.start()
+
+async def on_stop(application: Application):
+    """Drain outgoing messages while the bot's HTTP client is still open"""
+    keep_warm_task = application.bot_data.pop('keep_warm_task', None)
+    if keep_warm_task:
+        keep_warm_task.cancel()
+        await asyncio.gather(keep_warm_task, return_exceptions=True)
+    await outbound.stop()
+
+async def on_shutdown(application: Application):
+    """Stop background services"""
+    logger.info(f"Connection stats at shutdown: {get_connection_stats()}")
+    logger.info(f"AI services health at shutdown: {get_health()}")
+    logger.info(f"LLM hedging stats at shutdown: {llm_router.get_stats()}")
+    await tts_backend.stop()
+    await stt_backend.stop()
+    await asyncio.to_thread(transcript_archive.stop)
+    await loop_monitor.stop()
+
+def setup_bot(with_updater: bool = True) -> Application:
+    """Initialize and configure the bot
 
-def setup_bot() -> Application:
-    """Initialize and configure the bot"""
-    application = Application.builder().token(TelegramToken).build()
+    with_updater=False builds an application without its own polling; updates
+    are then fed into application.update_queue by the caller (see sharded_runner).
+    """
+    builder = (
+        Application.builder()
+        .token(TelegramToken)
+        .request(build_telegram_request())
+        .get_updates_request(build_telegram_request(polling=True))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    application = builder.build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(handle_callback))
@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонён: внешний сервис помечен как недоступный"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Сервис '{name}' временно недоступен")
+        self.name = name
+
+
+class CircuitBreaker:
+    """Предохранитель для обращений к внешнему сервису.
+
+    После failure_threshold ошибок или таймаутов подряд переходит в
+    состояние open и сразу отклоняет вызовы. Через recovery_timeout
+    пропускает один пробный вызов (half_open): успех закрывает
+    предохранитель, ошибка снова его открывает.
+
+    Таймаут считается ошибкой сервиса, если на вызов было отведено не
+    меньше failure_timeout (по умолчанию половина call_timeout). Более
+    короткий таймаут означает, что вызов оборвал дедлайн вызывающего.
+    """
+
+    def __init__(self, name: str, call_timeout: float, failure_threshold: int = 3,
+                 recovery_timeout: float = 30.0, failure_timeout: Optional[float] = None):
+        self.name = name
+        self.call_timeout = call_timeout
+        self.failure_timeout = call_timeout / 2 if failure_timeout is None else failure_timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Сервис недоступен и пробный вызов ещё не разрешён"""
+        return self.state == OPEN or (self.state == HALF_OPEN and self._trial_in_flight)
+
+    def _allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self._state != CLOSED:
+            logger.info(f"Предохранитель '{self.name}' закрыт: сервис снова доступен")
+        self._state = CLOSED
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self, error: Exception):
+        self._failures += 1
+        self._last_error = str(error) or type(error).__name__
+        self._trial_in_flight = False
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(
+                    f"Предохранитель '{self.name}' открыт после {self._failures} ошибок: {self._last_error}"
+                )
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    async def call(self, func: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Вызов с таймаутом; при открытом предохранителе - CircuitOpenError.
+
+        timeout может только сократить call_timeout (например, по дедлайну хода).
+        """
+        if not self._allow():
+            raise CircuitOpenError(self.name)
+        call_timeout = self.call_timeout if timeout is None else min(timeout, self.call_timeout)
+        try:
+            result = await asyncio.wait_for(func(), timeout=call_timeout)
+        except asyncio.CancelledError:
+            self._trial_in_flight = False
+            raise
+        except (asyncio.TimeoutError, TimeoutError) as e:
+            # Сюда же попадает DeadlineExceeded, если дедлайн вызываемой
+            # функции сработал раньше wait_for
+            if call_timeout < self.failure_timeout:
+                # Исчерпан бюджет вызывающего, а не терпение к сервису
+                self._trial_in_flight = False
+            else:
+                self.record_failure(TimeoutError(f"таймаут {call_timeout}s"))
+            raise TimeoutError(f"Сервис '{self.name}' не ответил за {call_timeout:.1f}s") from e
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self._failures,
+            'last_error': self._last_error,
+        }
+
+
+def _breaker_from_env(name: str, default_timeout: float) -> CircuitBreaker:
+    prefix = f'BREAKER_{name.upper()}'
+    failure_timeout = os.environ.get(f'{prefix}_FAILURE_TIMEOUT')
+    return CircuitBreaker(
+        name,
+        call_timeout=float(os.environ.get(f'{prefix}_TIMEOUT', default_timeout)),
+        failure_threshold=int(os.environ.get(f'{prefix}_FAILURES', 3)),
+        recovery_timeout=float(os.environ.get(f'{prefix}_RECOVERY', 30)),
+        failure_timeout=float(failure_timeout) if failure_timeout else None,
+    )
+
+
+# Предохранители внешних AI-сервисов
+chat_breaker = _breaker_from_env('chat', 20)
+transcription_breaker = _breaker_from_env('transcription', 30)
+speech_breaker = _breaker_from_env('speech', 20)
+
+
+def get_health() -> Dict[str, Dict[str, Any]]:
+    """Состояние всех внешних AI-сервисов"""
+    return {
+        breaker.name: breaker.health()
+        for breaker in (chat_breaker, transcription_breaker, speech_breaker)
+    }
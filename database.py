@@ -2,7 +2,7 @@ import os
 import sys
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, LargeBinary
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from config import host, user, password, database, port
 
@@ -39,6 +39,17 @@ class Session(Base):
     questions_asked = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Transcript(Base):
+    __tablename__ = 'transcript'
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey('session.id'), nullable=False, index=True)
+    # Реплики консультации в сжатом колоночном формате (см. transcript_archive)
+    codec = Column(String(20), nullable=False)
+    turn_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Настройка подключения к базе данных PostgreSQL
 def setup_database():
     """Инициализация базы данных и создание всех таблиц"""
@@ -115,7 +126,7 @@ def get_user_statistics(user_id: int) -> dict:
         logger.error(f"Ошибка при получении статистики пользователя: {str(e)}")
         return {}
 
-if not setup_database():
+if not db_session:
     logger.error("Не удалось инициализировать базу данных. Завершение работы...")
     sys.exit(1)
 
@@ -1,9 +1,13 @@
 import json
+import time
 import logging
-from typing import Dict, Optional, Any
+from typing import Any, Callable, Dict, Optional
 from difflib import SequenceMatcher
 import random
 from database import User, Session, db_session
+from transcript_archive import transcript_archive
+from scenario_scheduler import ScenarioScheduler
+from feedback_engine import FeedbackEngine
 
 logger = logging.getLogger(__name__)
 
@@ -26,17 +30,31 @@ class ConversationManager:
         except Exception as e:
             logger.error(f"Ошибка при загрузке сценариев: {e}")
             self.scenarios = []
+        self.scheduler = ScenarioScheduler(self.scenarios)
+        self.feedback = FeedbackEngine(self.scenarios)
+
+    def load_history(self, owns_user: Optional[Callable[[int], bool]] = None):
+        """Загрузка истории консультаций для выбора сценариев"""
+        self.scheduler.load(owns_user=owns_user)
 
     def start_conversation(self, user_id: int, difficulty: str):
         """Начало нового диалога с выбранным уровнем сложности"""
-        scenario = self._select_scenario(difficulty)
+        scenario = self._select_scenario(difficulty, user_id)
         self.active_conversations[user_id] = {
             'difficulty': difficulty,
             'scenario': scenario,
             'questions_asked': [],
+            'turns': [],
+            'hints_covered': 0,
             'diagnosis_made': False
         }
 
+    def _add_turn(self, user_id: int, role: str, text: str):
+        """Запись реплики в расшифровку текущей консультации"""
+        conversation = self.active_conversations.get(user_id)
+        if conversation is not None and text:
+            conversation.setdefault('turns', []).append({'role': role, 'text': text, 'ts': time.time()})
+
     def add_question(self, user_id: int, question: str):
         """Отслеживание вопросов, заданных пользователем"""
         try:
@@ -45,16 +63,47 @@ class ConversationManager:
                     self.active_conversations[user_id]['questions_asked'] = []
                 if question and isinstance(question, str):
                     self.active_conversations[user_id]['questions_asked'].append(question)
+                    self._add_turn(user_id, 'doctor', question)
+                    # Покрытие рекомендуемых вопросов учитывается сразу
+                    conversation = self.active_conversations[user_id]
+                    covered = self.feedback.match_question(conversation['scenario']['id'], question)
+                    conversation['hints_covered'] = conversation.get('hints_covered', 0) | covered
                     logger.debug(f"Добавлен вопрос для пользователя {user_id}. Всего вопросов: {len(self.active_conversations[user_id]['questions_asked'])}")
             else:
                 logger.warning(f"Попытка добавить вопрос для неактивного диалога: user_id={user_id}")
         except Exception as e:
             logger.error(f"Ошибка при добавлении вопроса: {str(e)}")
 
-    def _select_scenario(self, difficulty: str) -> dict:
-        """Выбор случайного сценария соответствующей сложности"""
-        suitable_scenarios = [s for s in self.scenarios if s['difficulty'] == difficulty]
-        return random.choice(suitable_scenarios)
+    def add_response(self, user_id: int, response: str):
+        """Отслеживание ответов пациента"""
+        self._add_turn(user_id, 'patient', response)
+
+    def get_missed_hints(self, user_id: int) -> tuple:
+        """Рекомендуемые вопросы, которые пользователь не задал в текущей консультации"""
+        conversation = self.active_conversations.get(user_id)
+        if not conversation:
+            return ()
+        return self.feedback.missed_hints(conversation['scenario']['id'], conversation.get('hints_covered', 0))
+
+    def get_glossary(self, user_id: int) -> Optional[str]:
+        """Глоссарий медицинских терминов текущего сценария"""
+        conversation = self.active_conversations.get(user_id)
+        if not conversation:
+            return None
+        return self.feedback.glossary(conversation['scenario']['id'])
+
+    def record_diagnosis(self, user_id: int, diagnosis: str, correct: bool):
+        """Сохранение поставленного диагноза и его оценки"""
+        if user_id in self.active_conversations:
+            self._add_turn(user_id, 'diagnosis', diagnosis)
+            self.active_conversations[user_id]['diagnosis_made'] = correct
+
+    def _select_scenario(self, difficulty: str, user_id: Optional[int] = None) -> dict:
+        """Выбор сценария соответствующей сложности с учётом истории пользователя"""
+        if user_id is None:
+            suitable_scenarios = [s for s in self.scenarios if s['difficulty'] == difficulty]
+            return random.choice(suitable_scenarios)
+        return self.scheduler.pick(user_id, difficulty)
 
     def get_initial_prompt(self, user_id: int) -> str:
         """Получение начального сообщения для пациента"""
@@ -83,11 +132,15 @@ class ConversationManager:
                 'questions_asked': len(context.get('questions_asked', [])),
                 'correct_diagnosis': context.get('diagnosis_made', False)
             }
-            self._update_user_progress(user_id, session_data)
+            self.scheduler.record(user_id, session_data['scenario_id'], bool(session_data['correct_diagnosis']))
+            session_id = self._update_user_progress(user_id, session_data)
+            if session_id is not None:
+                # Расшифровка записывается в фоне
+                transcript_archive.append(session_id, context.get('turns', []))
             del self.active_conversations[user_id]
 
-    def _update_user_progress(self, user_id: int, session_data: Dict[str, Any]):
-        """Обновление прогресса пользователя в базе данных"""
+    def _update_user_progress(self, user_id: int, session_data: Dict[str, Any]) -> Optional[int]:
+        """Обновление прогресса пользователя в базе данных, возвращает id сессии"""
         try:
             with db_session() as session:
                 user = session.query(User).filter_by(telegram_id=user_id).first()
@@ -101,8 +154,10 @@ class ConversationManager:
                     )
                     session.add(new_session)
                     session.commit()
+                    return new_session.id
         except Exception as e:
             logger.error(f"Ошибка при обновлении прогресса пользователя: {str(e)}")
+        return None
 
     def get_user_statistics(self, user_id: int) -> Dict[str, Any]:
         """Получение статистики пользователя"""
@@ -0,0 +1,203 @@
+import re
+import logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Служебные слова подсказок, не несущие смысла для сопоставления с вопросом
+STOP_WORDS = frozenset({
+    'ask', 'about', 'check', 'for', 'inquire', 'the', 'and', 'or', 'of', 'to', 'in',
+    'like', 'other', 'any', 'related', 'a', 'an', 'do', 'does', 'did', 'you', 'your',
+    'have', 'has', 'is', 'are', 'there', 'what', 'how', 'when', 'where',
+})
+
+# Слова-модификаторы уточняют подсказку ("history of", "family", "blood"),
+# но не задают её тему: они не обязательны для покрытия и сами по себе его
+# не дают. Подсказка только из модификаторов ("pain location") требует их все
+GENERIC_WORDS = frozenset({
+    'pain', 'history', 'symptoms', 'problems', 'changes', 'characteristics', 'previous',
+    'recent', 'associated', 'patterns', 'habits', 'factors', 'location', 'similar',
+    'difficulty', 'difficulties', 'health', 'thoughts', 'risk', 'family', 'blood',
+})
+
+# Синонимы: слово подсказки -> бытовые слова, которыми его заменяет студент
+SYNONYMS = {
+    'hypertension': ('pressure',),
+    'vision': ('see', 'seeing', 'eyesight', 'visual', 'blurry', 'blurred'),
+    'visual': ('see', 'seeing', 'eyesight', 'vision', 'blurry', 'blurred'),
+    'fever': ('temperature', 'feverish', 'hot', 'chills', 'shivering'),
+    'chills': ('shivering', 'shivers'),
+    'swallowing': ('swallow',),
+    'medication': ('medicine', 'medicines', 'drugs', 'pills', 'tablets'),
+    'diet': ('eat', 'eating', 'food'),
+    'eating': ('eat', 'food', 'meals', 'diet'),
+    'meals': ('meal', 'eat', 'eating', 'food'),
+    'drinking': ('drink', 'thirst', 'thirsty', 'water'),
+    'weight': ('weigh', 'kilos', 'pounds'),
+    'numbness': ('numb', 'tingling'),
+    'extremities': ('hands', 'feet', 'legs', 'arms', 'fingers', 'toes'),
+    'sleep': ('sleeping', 'insomnia', 'asleep'),
+    'appetite': ('hungry', 'eat', 'eating'),
+    'daily': ('day', 'everyday', 'routine'),
+    'motivation': ('motivated', 'interest', 'interested', 'enjoy'),
+    'mental': ('depression', 'depressed', 'anxiety', 'psychiatric', 'psychologist', 'psychiatrist'),
+    'suicidal': ('suicide', 'harm', 'harming', 'hurting', 'kill'),
+    'breathing': ('breath', 'breathe', 'breathless'),
+    'radiation': ('spread', 'spreads', 'radiate', 'radiates', 'move', 'moves'),
+    'sweating': ('sweat', 'sweaty'),
+    'light': ('bright', 'photophobia'),
+    'sensitivity': ('sensitive', 'bother', 'bothers', 'hurt', 'hurts'),
+    'nausea': ('nauseous', 'sick'),
+    'vomiting': ('vomit', 'throw', 'threw'),
+    'allergies': ('allergic', 'allergy'),
+    'seasonal': ('season', 'spring', 'summer', 'autumn', 'winter'),
+    'eye': ('eyes', 'itchy', 'watery'),
+    'timing': ('time', 'when', 'after', 'before'),
+    'episodes': ('episode', 'before', 'previously', 'again'),
+    'triggers': ('trigger', 'triggered', 'worse', 'brings'),
+    'physical': ('exercise', 'exertion', 'walking', 'stairs'),
+    'activity': ('exercise', 'exertion', 'walking', 'stairs'),
+    'stress': ('anxious', 'worried', 'tense'),
+    'cardiovascular': ('heart', 'cholesterol', 'smoke', 'smoking', 'diabetes'),
+    'location': ('where', 'point', 'show'),
+    'characteristics': ('describe', 'sharp', 'dull', 'burning', 'pressing', 'type', 'kind'),
+    'lifestyle': ('smoke', 'smoking', 'alcohol', 'drink', 'exercise', 'job', 'work', 'stress'),
+}
+
+# Слабые синонимы: слишком частые в любом вопросе, чтобы покрыть подсказку
+# без совпадения хотя бы одного сильного слова
+WEAK_SYNONYMS = frozenset({
+    'see', 'when', 'after', 'before', 'again', 'time', 'where', 'point', 'show', 'hot', 'sick',
+})
+
+# Ключевое слово подсказки: сильные и слабые основы, которыми его можно покрыть
+Keyword = Tuple[FrozenSet[str], FrozenSet[str]]
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"[a-z]+", text.lower())
+
+
+def _stem(word: str) -> str:
+    """Грубая основа слова: общего префикса хватает для сопоставления форм"""
+    if len(word) > 3 and word.endswith('s'):
+        word = word[:-1]
+    return word[:5]
+
+
+class CompiledScenario:
+    """Заранее подготовленные тексты обратной связи по сценарию"""
+    __slots__ = ('hints', 'hint_keywords', 'glossary', '_missed_cache')
+
+    def __init__(self, hints: List[str], glossary: Optional[str],
+                 hint_keywords: List[Tuple[Tuple[Keyword, ...], int]]):
+        self.hints = hints
+        self.hint_keywords = hint_keywords
+        self.glossary = glossary
+        self._missed_cache: Dict[int, Tuple[str, ...]] = {}
+
+    def missed(self, covered: int) -> Tuple[str, ...]:
+        """Подсказки, не покрытые вопросами студента (результат кешируется по маске)"""
+        missed = self._missed_cache.get(covered)
+        if missed is None:
+            missed = tuple(hint for i, hint in enumerate(self.hints) if not covered >> i & 1)
+            self._missed_cache[covered] = missed
+        return missed
+
+
+def _keyword(words: List[str]) -> Keyword:
+    """Основы слов-альтернатив и их синонимов, разделённые на сильные и слабые"""
+    strong, weak = set(), set()
+    for word in words:
+        strong.add(_stem(word))
+        for synonym in SYNONYMS.get(word, ()):
+            (weak if synonym in WEAK_SYNONYMS else strong).add(_stem(synonym))
+    return frozenset(strong), frozenset(weak - strong)
+
+
+def _compile_hint(hint: str) -> Tuple[Tuple[Keyword, ...], int]:
+    """Ключевые слова подсказки и число совпадений, нужное для её покрытия.
+
+    Слова, соединённые "or", считаются одним ключевым словом с
+    альтернативами. Подсказку покрывает совпадение с третью её тематических
+    слов (с округлением вверх), то есть для короткой подсказки хватает
+    одного; модификаторы учитываются, только если тематических слов нет.
+    """
+    topic, modifiers = [], []
+    alternative = False
+    for word in _tokens(hint):
+        if word == 'or':
+            alternative = True
+            continue
+        if word in STOP_WORDS:
+            continue
+        group = modifiers if word in GENERIC_WORDS else topic
+        if alternative and group:
+            group[-1].append(word)
+        else:
+            group.append([word])
+        alternative = False
+    if topic:
+        return tuple(_keyword(words) for words in topic), -(-len(topic) // 3)
+    return tuple(_keyword(words) for words in modifiers), len(modifiers)
+
+
+def _compile_glossary(medical_terms: dict) -> Optional[str]:
+    if not medical_terms:
+        return None
+    text = "📚 Медицинские термины по данному случаю:\n\n"
+    for term, translations in medical_terms.items():
+        text += f"• {translations['en']} - {translations['ru']}\n"
+    return text
+
+
+class FeedbackEngine:
+    """Обратная связь по консультации.
+
+    Глоссарий и ключевые слова подсказок готовятся один раз при загрузке
+    сценариев. Каждый вопрос студента сразу сопоставляется с подсказками,
+    а покрытые подсказки накапливаются в битовой маске, поэтому при
+    постановке диагноза остаётся только взять непокрытые подсказки.
+    """
+
+    def __init__(self, scenarios: List[dict]):
+        self._compiled: Dict[str, CompiledScenario] = {}
+        for scenario in scenarios:
+            hints = list(scenario.get('hints', []))
+            self._compiled[scenario['id']] = CompiledScenario(
+                hints=hints,
+                glossary=_compile_glossary(scenario.get('medical_terms')),
+                hint_keywords=[_compile_hint(hint) for hint in hints],
+            )
+        logger.info(f"Подготовлена обратная связь для {len(self._compiled)} сценариев")
+
+    def match_question(self, scenario_id: str, question: str) -> int:
+        """Маска подсказок, которые покрывает вопрос"""
+        compiled = self._compiled.get(scenario_id)
+        if compiled is None or not compiled.hints:
+            return 0
+        stems = {_stem(word) for word in _tokens(question)}
+        mask = 0
+        for i, (keywords, required) in enumerate(compiled.hint_keywords):
+            if not keywords:
+                continue
+            matched = strong = 0
+            for strong_variants, weak_variants in keywords:
+                if strong_variants & stems:
+                    matched += 1
+                    strong += 1
+                elif weak_variants & stems:
+                    matched += 1
+            if strong and matched >= required:
+                mask |= 1 << i
+        return mask
+
+    def missed_hints(self, scenario_id: str, covered: int) -> Tuple[str, ...]:
+        """Рекомендуемые вопросы, которые студент не задал"""
+        compiled = self._compiled.get(scenario_id)
+        return compiled.missed(covered) if compiled else ()
+
+    def glossary(self, scenario_id: str) -> Optional[str]:
+        """Готовый текст глоссария медицинских терминов сценария"""
+        compiled = self._compiled.get(scenario_id)
+        return compiled.glossary if compiled else None
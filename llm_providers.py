@@ -0,0 +1,256 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque, Counter
+from typing import Deque, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Маршрут - упорядоченный список пар (провайдер, модель) для отката
+Route = List[Tuple[str, str]]
+
+DEFAULT_ROUTES = {
+    'beginner': 'openai:gpt-4o-mini',
+    'intermediate': 'openai:gpt-4o',
+    'advanced': 'openai:gpt-4o',
+    'default': 'openai:gpt-4o',
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени на ход диалога исчерпан"""
+
+
+class ChatProvider:
+    """Провайдер чат-моделей с OpenAI-совместимым API"""
+
+    def __init__(self, name: str, client: AsyncOpenAI):
+        self.name = name
+        self.client = client
+
+    async def complete(self, messages: List[dict], model: str, max_tokens: int,
+                       timeout: Optional[float] = None) -> str:
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            timeout=timeout,
+        )
+        return response.choices[0].message.content
+
+
+class HedgingPolicy:
+    """Политика дублирующих (hedged) запросов.
+
+    Если основной запрос не завершился за время, соответствующее
+    percentile наблюдаемых задержек модели, отправляется дубликат.
+    Доля дублей среди запросов ограничена max_rate - это и есть
+    допустимый перерасход.
+    """
+
+    def __init__(self, percentile: float = 0.95, max_rate: float = 0.05,
+                 min_samples: int = 20, window: int = 200, min_delay: float = 0.5,
+                 report_interval: float = 60.0):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.report_interval = report_interval
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._window = window
+        self._recent: Deque[bool] = deque(maxlen=window)
+        self._next_report = time.monotonic() + report_interval
+        self.stats: Counter = Counter()
+
+    def record_latency(self, key: Tuple[str, str], latency: float):
+        self._latencies.setdefault(key, deque(maxlen=self._window)).append(latency)
+
+    def hedge_delay(self, key: Tuple[str, str]) -> Optional[float]:
+        """Задержка перед отправкой дубликата или None, если истории задержек мало"""
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def allow_hedge(self) -> bool:
+        """Можно ли отправить дубликат медленного запроса, не превысив max_rate"""
+        if self._recent and sum(self._recent) / len(self._recent) >= self.max_rate:
+            self.stats['hedges_suppressed'] += 1
+            return False
+        return True
+
+    def record_request(self, hedged: bool, hedge_won: bool = False):
+        self._recent.append(hedged)
+        self.stats['requests'] += 1
+        if hedged:
+            self.stats['hedges'] += 1
+        if hedge_won:
+            self.stats['hedge_wins'] += 1
+        now = time.monotonic()
+        if self.report_interval > 0 and now >= self._next_report:
+            self._next_report = now + self.report_interval
+            logger.info(f"Статистика дублирующих запросов LLM: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        requests = stats.get('requests', 0)
+        stats['hedge_rate'] = round(stats.get('hedges', 0) / requests, 4) if requests else 0.0
+        return stats
+
+
+def parse_route(spec: str) -> Route:
+    """Разбор маршрута вида 'openai:gpt-4o-mini,local:llama-3.1-8b'"""
+    route = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, _, model = entry.partition(':')
+        if not model:
+            raise ValueError(f"Некорректный элемент маршрута LLM: '{entry}'")
+        route.append((provider.strip(), model.strip()))
+    return route
+
+
+async def _cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class LLMRouter:
+    """Выбор модели по уровню сложности и откат между провайдерами.
+
+    Для каждого уровня задаётся список (провайдер, модель); при ошибке
+    запрос повторяется у следующего элемента маршрута. Все попытки
+    укладываются в переданный дедлайн, медленные запросы дублируются
+    согласно HedgingPolicy.
+    """
+
+    def __init__(self, providers: Dict[str, ChatProvider], routes: Dict[str, Route],
+                 hedging: Optional[HedgingPolicy] = None):
+        self.providers = providers
+        self.hedging = hedging or HedgingPolicy()
+        self.routes = {}
+        for difficulty, route in routes.items():
+            known = [(p, m) for p, m in route if p in providers]
+            for p, m in route:
+                if p not in providers:
+                    logger.warning(f"Провайдер '{p}' не настроен, пропускаем {m} для уровня {difficulty}")
+            self.routes[difficulty] = known
+        if not self.routes.get('default'):
+            raise ValueError("Не задан маршрут LLM по умолчанию")
+
+    def route_for(self, difficulty: Optional[str]) -> Route:
+        return self.routes.get(difficulty) or self.routes['default']
+
+    async def complete(self, messages: List[dict], difficulty: Optional[str] = None,
+                       max_tokens: int = 150, deadline: Optional[float] = None) -> str:
+        """Получение ответа модели; deadline - момент времени по часам цикла событий"""
+        loop = asyncio.get_running_loop()
+        last_error = None
+        for provider_name, model in self.route_for(difficulty):
+            remaining = deadline - loop.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded("Бюджет времени на ответ исчерпан") from last_error
+            try:
+                content = await self._hedged(provider_name, model, messages, max_tokens, remaining)
+                logger.debug(f"Ответ получен от {provider_name}:{model} (уровень {difficulty})")
+                return content
+            except Exception as e:
+                logger.warning(f"Ошибка LLM {provider_name}:{model}, пробуем следующий провайдер: {str(e)}")
+                last_error = e
+        raise last_error or RuntimeError("Нет доступных провайдеров LLM")
+
+    async def _hedged(self, provider_name: str, model: str, messages: List[dict],
+                      max_tokens: int, remaining: Optional[float]) -> str:
+        loop = asyncio.get_running_loop()
+        key = (provider_name, model)
+        provider = self.providers[provider_name]
+        started = loop.time()
+
+        launched: Dict[asyncio.Task, float] = {}
+
+        def launch():
+            task = loop.create_task(provider.complete(messages, model, max_tokens, timeout=remaining))
+            launched[task] = loop.time()
+            return task
+
+        primary = launch()
+        tasks = {primary}
+        hedge = None
+        delay = self.hedging.hedge_delay(key)
+        if delay is not None and (remaining is None or delay < remaining):
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.hedging.allow_hedge():
+                logger.debug(f"Запрос к {provider_name}:{model} дольше {delay:.2f}s, отправляем дубликат")
+                hedge = launch()
+                tasks.add(hedge)
+
+        last_error = None
+        try:
+            while tasks:
+                timeout = started + remaining - loop.time() if remaining is not None else None
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded(f"{provider_name}:{model} не ответил в пределах дедлайна")
+                for task in done:
+                    if task.exception() is None:
+                        # Задержка самого запроса: у дубликата - без времени ожидания перед ним
+                        self.hedging.record_latency(key, loop.time() - launched[task])
+                        self.hedging.record_request(hedge is not None, task is hedge)
+                        return task.result()
+                    last_error = task.exception()
+            self.hedging.record_request(hedge is not None)
+            raise last_error
+        except DeadlineExceeded:
+            self.hedging.record_request(hedge is not None)
+            raise
+        finally:
+            if tasks:
+                # Проигравший запрос отменяется
+                await _cancel(tasks)
+
+    def get_stats(self) -> Dict[str, float]:
+        return self.hedging.get_stats()
+
+
+def create_llm_router(client: AsyncOpenAI) -> LLMRouter:
+    """Создание маршрутизатора LLM по переменным окружения.
+
+    LLM_LOCAL_BASE_URL подключает локальный OpenAI-совместимый сервер
+    (например, llama.cpp server); LLM_ROUTE_<УРОВЕНЬ> переопределяет маршрут;
+    LLM_HEDGE_PERCENTILE и LLM_HEDGE_MAX_RATE настраивают дублирование запросов,
+    LLM_HEDGE_REPORT_INTERVAL - период записи его статистики в лог.
+    """
+    providers = {'openai': ChatProvider('openai', client)}
+
+    local_url = os.environ.get('LLM_LOCAL_BASE_URL')
+    local_model = os.environ.get('LLM_LOCAL_MODEL', 'local-model')
+    if local_url:
+        providers['local'] = ChatProvider('local', AsyncOpenAI(
+            api_key=os.environ.get('LLM_LOCAL_API_KEY', 'not-needed'),
+            base_url=local_url,
+        ))
+
+    routes = {}
+    for difficulty, default_spec in DEFAULT_ROUTES.items():
+        spec = os.environ.get(f'LLM_ROUTE_{difficulty.upper()}')
+        if spec is None:
+            spec = default_spec
+            if local_url:
+                # Локальная модель служит запасным вариантом при сбое OpenAI
+                spec += f",local:{local_model}"
+        routes[difficulty] = parse_route(spec)
+
+    hedging = HedgingPolicy(
+        percentile=float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95)),
+        max_rate=float(os.environ.get('LLM_HEDGE_MAX_RATE', 0.05)),
+        report_interval=float(os.environ.get('LLM_HEDGE_REPORT_INTERVAL', 60.0)),
+    )
+    return LLMRouter(providers, routes, hedging)
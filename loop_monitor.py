@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque, Counter
+from typing import Dict, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+# Модули, функции которых считаются обработчиками Telegram
+HANDLER_MODULES = ('bot_handlers',)
+# Модули, функции которых считаются стадиями обработки
+STAGE_MODULES = ('ai_integration', 'dialog_manager', 'database')
+
+
+def _module_of(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def attribute_stack(stack: traceback.StackSummary) -> Tuple[str, str]:
+    """Определение обработчика и стадии, на которых заблокирован цикл событий.
+
+    Обработчик - самый внешний кадр из bot_handlers, стадия - самый
+    внутренний кадр из модулей приложения; вызовы SQLAlchemy
+    относятся к стадии db_session.
+    """
+    handler = 'unknown'
+    stage = 'unknown'
+    for frame in stack:
+        module = _module_of(frame.filename)
+        if handler == 'unknown' and module in HANDLER_MODULES:
+            handler = frame.name
+        if module in STAGE_MODULES:
+            stage = frame.name
+        if f"{os.sep}sqlalchemy{os.sep}" in frame.filename:
+            stage = 'db_session'
+            break
+    if stage == 'unknown' and handler != 'unknown':
+        stage = handler
+    return handler, stage
+
+
+class LoopLagMonitor:
+    """Сторожевой таймер задержки цикла asyncio.
+
+    Корутина-зонд периодически засыпает на interval и измеряет, насколько
+    позже она проснулась. Отдельный поток следит за сердцебиением зонда и,
+    если цикл не отвечает дольше threshold, снимает стек потока цикла,
+    чтобы показать, какой синхронный вызов его блокирует.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.5,
+                 report_interval: float = 60.0, samples: int = 1024):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self._lags: deque = deque(maxlen=samples)
+        self._max_lag = 0.0
+        self._slow_callbacks: Counter = Counter()
+        self._last_stall: Optional[Dict[str, Any]] = None
+        self._heartbeat = time.monotonic()
+        self._stall_reported = False
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'LoopLagMonitor':
+        """Создание монитора с параметрами из переменных окружения"""
+        return cls(
+            interval=float(os.environ.get('LOOP_MONITOR_INTERVAL', 0.1)),
+            threshold=float(os.environ.get('LOOP_MONITOR_THRESHOLD', 0.5)),
+            report_interval=float(os.environ.get('LOOP_MONITOR_REPORT_INTERVAL', 60.0)),
+        )
+
+    async def start(self):
+        """Запуск зонда в текущем цикле событий и сторожевого потока"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._probe())
+        self._watchdog = threading.Thread(
+            target=self._watch, name='loop-lag-watchdog', daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Монитор задержки цикла запущен (interval={self.interval}s, threshold={self.threshold}s)"
+        )
+
+    async def stop(self):
+        """Остановка зонда и сторожевого потока"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+        logger.info(f"Монитор задержки цикла остановлен: {self.get_stats()}")
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag = max(0.0, now - expected)
+            with self._lock:
+                self._heartbeat = time.monotonic()
+                self._stall_reported = False
+                self._lags.append(lag)
+                self._max_lag = max(self._max_lag, lag)
+            if lag > self.threshold:
+                logger.warning(f"Цикл событий был заблокирован на {lag:.3f}s")
+            if now >= next_report:
+                logger.info(f"Задержка цикла событий: {self.get_stats()}")
+                next_report = now + self.report_interval
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                stalled = time.monotonic() - self._heartbeat - self.interval
+                if stalled <= self.threshold or self._stall_reported:
+                    continue
+                self._stall_reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            handler, stage = attribute_stack(stack)
+            with self._lock:
+                self._slow_callbacks[(handler, stage)] += 1
+                self._last_stall = {
+                    'handler': handler,
+                    'stage': stage,
+                    'stalled': round(stalled, 3),
+                    'stack': ''.join(stack.format()),
+                }
+            logger.warning(
+                f"Медленный обратный вызов: цикл не отвечает {stalled:.3f}s "
+                f"(handler={handler}, stage={stage})\n{''.join(stack.format())}"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики задержки цикла и счётчики медленных вызовов"""
+        with self._lock:
+            lags = sorted(self._lags)
+            slow = {f"{h}/{s}": n for (h, s), n in self._slow_callbacks.items()}
+            max_lag = self._max_lag
+
+        def percentile(p: float) -> float:
+            if not lags:
+                return 0.0
+            return lags[min(len(lags) - 1, int(p * len(lags)))]
+
+        return {
+            'samples': len(lags),
+            'lag_p50': round(percentile(0.50), 4),
+            'lag_p99': round(percentile(0.99), 4),
+            'lag_max': round(max_lag, 4),
+            'slow_callbacks': slow,
+        }
+
+    @property
+    def last_stall(self) -> Optional[Dict[str, Any]]:
+        """Сведения о последней зафиксированной блокировке цикла"""
+        with self._lock:
+            return dict(self._last_stall) if self._last_stall else None
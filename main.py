@@ -1,8 +1,5 @@
 import logging
 import os
-from bot_handlers import setup_bot
-from telegram import Update
-from database import db_session
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,6 +11,11 @@ logger = logging.getLogger(__name__)
 
 def run_telegram_bot():
     """Запуск Telegram бота"""
+    # Модули бота импортируются здесь, а не при загрузке main.py: процессы
+    # пулов распознавания и синтеза речи (spawn) заново импортируют главный
+    # модуль и не должны подключаться к базе данных и создавать клиентов API
+    from telegram import Update
+    from bot_handlers import setup_bot
     try:
         logger.info("Настройка Telegram бота...")
         application = setup_bot()
@@ -23,10 +25,24 @@ def run_telegram_bot():
         logger.error(f"Ошибка в Telegram боте: {str(e)}", exc_info=True)
         raise
 
+def run_sharded_telegram_bot(workers: int):
+    """Запуск Telegram бота в нескольких процессах-шардах"""
+    from sharded_runner import run_sharded
+    try:
+        logger.info(f"Запуск бота в {workers} процессах...")
+        run_sharded(workers)
+    except Exception as e:
+        logger.error(f"Ошибка в многопроцессном режиме: {str(e)}", exc_info=True)
+        raise
+
 def main():
     try:
         logger.info("Starting Medical English Practice Bot...")
-        run_telegram_bot()
+        workers = int(os.environ.get('BOT_WORKERS', 1))
+        if workers > 1:
+            run_sharded_telegram_bot(workers)
+        else:
+            run_telegram_bot()
     except Exception as e:
         logger.error(f"Critical error in main: {str(e)}", exc_info=True)
         raise
@@ -0,0 +1,255 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque, Counter
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих операций
+REPLY = 0       # ответы пользователю
+COSMETIC = 1    # служебные правки и удаления сообщений
+
+# Максимальная длина текстового сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, reserve: float = 0.0) -> float:
+        """Сколько секунд ждать токена; reserve токенов остаются для более важных операций"""
+        self._refill()
+        return max(0.0, (1 + reserve - self.tokens) / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+    async def acquire(self, reserve: float = 0.0):
+        """Получение токена с ожиданием"""
+        while True:
+            delay = self.delay(reserve)
+            if delay <= 0:
+                self.take()
+                return
+            await asyncio.sleep(delay)
+
+
+class _Job:
+    __slots__ = ('kind', 'priority', 'call', 'bot', 'text', 'kwargs', 'future')
+
+    def __init__(self, kind: str, priority: int, future: asyncio.Future,
+                 call: Optional[Callable[[], Awaitable[Any]]] = None,
+                 bot=None, text: Optional[str] = None, kwargs: Optional[dict] = None):
+        self.kind = kind
+        self.priority = priority
+        self.call = call
+        self.bot = bot
+        self.text = text
+        self.kwargs = kwargs or {}
+        self.future = future
+
+
+def _consume_exception(future: asyncio.Future):
+    # Ошибки фоновых операций уже залогированы планировщиком
+    if not future.cancelled():
+        future.exception()
+
+
+class OutboundScheduler:
+    """Планировщик исходящих сообщений с учётом ограничений Telegram.
+
+    Соблюдает общий лимит бота и лимит на чат с помощью вёдер токенов,
+    объединяет подряд идущие тексты в один чат в одно сообщение и
+    отправляет ответы раньше служебных правок и удалений.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0,
+                 chat_burst: float = 3.0, group_rate: float = 20 / 60,
+                 cosmetic_reserve: float = 0.2, max_retries: int = 3):
+        # Доля общего лимита, недоступная служебным операциям
+        self.cosmetic_reserve = global_rate * min(max(cosmetic_reserve, 0.0), 1.0)
+        # При малом лимите (например, на шард) ведро должно вмещать токен
+        # служебной операции вместе с резервом, иначе она ждёт вечно
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1 + self.cosmetic_reserve))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Dict[int, Deque[_Job]]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._stats: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> 'OutboundScheduler':
+        """Создание планировщика с параметрами из переменных окружения"""
+        return cls(
+            global_rate=float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30)),
+            chat_rate=float(os.environ.get('TELEGRAM_CHAT_RATE', 1)),
+            chat_burst=float(os.environ.get('TELEGRAM_CHAT_BURST', 3)),
+        )
+
+    def send_text(self, bot, chat_id: int, text: str, reply_markup=None) -> asyncio.Future:
+        """Постановка текстового ответа в очередь.
+
+        Возвращает future с отправленным сообщением; тексты, поставленные
+        подряд без ожидания, могут быть объединены в одно сообщение.
+        """
+        return self._enqueue(chat_id, _Job(
+            'text', REPLY, self._new_future(), bot=bot, text=text,
+            kwargs={'reply_markup': reply_markup},
+        ))
+
+    def send_voice(self, bot, chat_id: int, voice, reply_markup=None) -> asyncio.Future:
+        """Постановка голосового ответа в очередь"""
+        return self._enqueue(chat_id, _Job(
+            'voice', REPLY, self._new_future(),
+            call=lambda: bot.send_voice(chat_id=chat_id, voice=voice, reply_markup=reply_markup),
+        ))
+
+    def edit_text(self, message, text: str, reply_markup=None,
+                  priority: int = COSMETIC) -> asyncio.Future:
+        """Постановка правки сообщения в очередь"""
+        return self._enqueue(message.chat_id, _Job(
+            'edit', priority, self._new_future(),
+            call=lambda: message.edit_text(text, reply_markup=reply_markup),
+        ))
+
+    def delete(self, message) -> asyncio.Future:
+        """Постановка удаления сообщения в очередь"""
+        return self._enqueue(message.chat_id, _Job(
+            'delete', COSMETIC, self._new_future(), call=message.delete,
+        ))
+
+    def get_stats(self) -> Dict[str, int]:
+        """Счётчики отправленных, объединённых и отложенных сообщений"""
+        stats = dict(self._stats)
+        stats['queued'] = sum(
+            len(queue) for queues in self._queues.values() for queue in queues.values()
+        )
+        return stats
+
+    async def stop(self):
+        """Ожидание отправки всех сообщений из очереди"""
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        logger.info(f"Планировщик исходящих сообщений остановлен: {self.get_stats()}")
+
+    def _new_future(self) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        return future
+
+    def _enqueue(self, chat_id: int, job: _Job) -> asyncio.Future:
+        queues = self._queues.setdefault(chat_id, {REPLY: deque(), COSMETIC: deque()})
+        queues[job.priority].append(job)
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.get_running_loop().create_task(self._serve_chat(chat_id))
+        return job.future
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные идентификаторы принадлежат группам с более строгим лимитом
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_batch(self, chat_id: int) -> List[_Job]:
+        """Следующая операция для чата; подряд идущие тексты объединяются"""
+        queues = self._queues[chat_id]
+        queue = queues[REPLY] if queues[REPLY] else queues[COSMETIC]
+        batch = [queue.popleft()]
+        if batch[0].kind != 'text':
+            return batch
+        length = len(batch[0].text)
+        while queue and queue[0].kind == 'text' and batch[-1].kwargs.get('reply_markup') is None:
+            length += len(COALESCE_SEPARATOR) + len(queue[0].text)
+            if length > MAX_MESSAGE_LENGTH:
+                break
+            batch.append(queue.popleft())
+        return batch
+
+    async def _serve_chat(self, chat_id: int):
+        queues = self._queues[chat_id]
+        chat_bucket = self._chat_bucket(chat_id)
+        try:
+            while any(queues.values()):
+                reserve = 0.0 if queues[REPLY] else self.cosmetic_reserve
+                delay = max(chat_bucket.delay(), self.global_bucket.delay(reserve))
+                if delay > 0:
+                    # После ожидания операция выбирается заново: за это время
+                    # мог прийти ответ, который важнее служебной правки
+                    await asyncio.sleep(delay)
+                    continue
+                chat_bucket.take()
+                self.global_bucket.take()
+                await self._run(chat_id, self._next_batch(chat_id))
+        finally:
+            del self._workers[chat_id]
+            if not any(queues.values()):
+                del self._queues[chat_id]
+
+    async def _run(self, chat_id: int, batch: List[_Job]):
+        """Выполнение операции; токены на первую попытку уже получены"""
+        head = batch[0]
+        if head.kind == 'text':
+            text = COALESCE_SEPARATOR.join(job.text for job in batch)
+            call = lambda: head.bot.send_message(
+                chat_id=chat_id, text=text, reply_markup=batch[-1].kwargs.get('reply_markup')
+            )
+        else:
+            call = head.call
+
+        reserve = self.cosmetic_reserve if head.priority == COSMETIC else 0.0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire(reserve)
+            try:
+                result = await call()
+                break
+            except RetryAfter as e:
+                self._stats['retry_after'] += 1
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Превышен лимит Telegram для чата {chat_id}, ожидание {delay}s")
+                if attempt == self.max_retries:
+                    self._fail(batch, e)
+                    return
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.warning(f"Ошибка отправки ({head.kind}) в чат {chat_id}: {str(e)}")
+                self._fail(batch, e)
+                return
+
+        self._stats[f'sent_{head.kind}'] += 1
+        if len(batch) > 1:
+            self._stats['coalesced'] += len(batch) - 1
+        for job in batch:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _fail(self, batch: List[_Job], error: Exception):
+        self._stats['failed'] += 1
+        for job in batch:
+            if not job.future.done():
+                job.future.set_exception(error)
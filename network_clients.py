@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+import logging
+import importlib.util
+from collections import Counter
+from typing import Any, Dict, Optional
+
+import httpx
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 требует пакет h2 (httpx[http2]); без него остаёмся на HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def http2_enabled() -> bool:
+    enabled = os.environ.get('NET_HTTP2', '1') not in ('0', 'false', 'no')
+    if enabled and not HTTP2_AVAILABLE:
+        logger.warning("HTTP/2 недоступен (не установлен пакет h2), используется HTTP/1.1")
+    return enabled and HTTP2_AVAILABLE
+
+
+def _limits(prefix: str, max_connections: int, max_keepalive: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int(f'{prefix}_MAX_CONNECTIONS', max_connections),
+        max_keepalive_connections=_env_int(f'{prefix}_MAX_KEEPALIVE', max_keepalive),
+        # По умолчанию httpx закрывает простаивающие соединения через 5 секунд
+        keepalive_expiry=_env_float(f'{prefix}_KEEPALIVE_EXPIRY', 120.0),
+    )
+
+
+class ConnectionStats:
+    """Статистика соединений HTTP-клиента.
+
+    Через расширение trace httpcore считает новые TCP-соединения и
+    TLS-рукопожатия с их длительностью; запросы без нового соединения
+    считаются повторным использованием.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._counters: Counter = Counter()
+        self._durations: Dict[str, float] = Counter()
+
+    def _on_trace(self, event: str, started: Dict[str, float]):
+        if event.endswith('.started'):
+            started[event[:-len('.started')]] = time.monotonic()
+            return
+        if not event.endswith('.complete'):
+            return
+        step = event[:-len('.complete')]
+        if step == 'connection.connect_tcp':
+            self._counters['tcp_connects'] += 1
+            self._durations['tcp_connect_seconds'] += time.monotonic() - started.get(step, time.monotonic())
+        elif step == 'connection.start_tls':
+            self._counters['tls_handshakes'] += 1
+            self._durations['tls_handshake_seconds'] += time.monotonic() - started.get(step, time.monotonic())
+
+    def _on_response(self, response: httpx.Response):
+        self._counters['requests'] += 1
+        self._counters[f'responses_{response.http_version}'] += 1
+
+    def request_hook(self, request: httpx.Request):
+        started: Dict[str, float] = {}
+        request.extensions['trace'] = lambda event, info: self._on_trace(event, started)
+
+    def response_hook(self, response: httpx.Response):
+        self._on_response(response)
+
+    async def async_request_hook(self, request: httpx.Request):
+        started: Dict[str, float] = {}
+
+        async def trace(event, info):
+            self._on_trace(event, started)
+
+        request.extensions['trace'] = trace
+
+    async def async_response_hook(self, response: httpx.Response):
+        self._on_response(response)
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self._counters)
+        requests = stats.get('requests', 0)
+        connects = stats.get('tcp_connects', 0)
+        stats['reused'] = max(0, requests - connects)
+        stats['reuse_ratio'] = round(stats['reused'] / requests, 3) if requests else 0.0
+        handshakes = stats.get('tls_handshakes', 0)
+        if handshakes:
+            stats['tls_handshake_avg_ms'] = round(
+                1000 * self._durations['tls_handshake_seconds'] / handshakes, 1
+            )
+        return stats
+
+
+openai_stats = ConnectionStats('openai')
+telegram_stats = ConnectionStats('telegram')
+
+
+def build_openai_http_client(proxy: Optional[str] = None) -> httpx.Client:
+    """Синхронный клиент для OpenAI (распознавание и синтез речи)"""
+    return httpx.Client(
+        transport=httpx.HTTPTransport(
+            proxy=httpx.Proxy(proxy) if proxy else None,
+            local_address="0.0.0.0" if proxy else None,
+            http2=http2_enabled(),
+            limits=_limits('OPENAI', 20, 10),
+        ),
+        event_hooks={
+            'request': [openai_stats.request_hook],
+            'response': [openai_stats.response_hook],
+        },
+    )
+
+
+def build_openai_async_http_client(proxy: Optional[str] = None) -> httpx.AsyncClient:
+    """Асинхронный клиент для OpenAI (чат-запросы)"""
+    return httpx.AsyncClient(
+        transport=httpx.AsyncHTTPTransport(
+            proxy=httpx.Proxy(proxy) if proxy else None,
+            local_address="0.0.0.0" if proxy else None,
+            http2=http2_enabled(),
+            limits=_limits('OPENAI', 100, 20),
+        ),
+        event_hooks={
+            'request': [openai_stats.async_request_hook],
+            'response': [openai_stats.async_response_hook],
+        },
+    )
+
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest с настраиваемым keep-alive и сбором статистики соединений"""
+
+    def __init__(self, limits: httpx.Limits, **kwargs):
+        self._limits = limits
+        super().__init__(**kwargs)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        self._client_kwargs['limits'] = self._limits
+        client = super()._build_client()
+        client.event_hooks['request'].append(telegram_stats.async_request_hook)
+        client.event_hooks['response'].append(telegram_stats.async_response_hook)
+        return client
+
+
+def build_telegram_request(polling: bool = False, proxy: Optional[str] = None) -> HTTPXRequest:
+    """Запросы к Bot API; polling=True - отдельный клиент для getUpdates"""
+    pool_size = 1 if polling else _env_int('TELEGRAM_POOL_SIZE', 256)
+    return TracedHTTPXRequest(
+        limits=_limits('TELEGRAM', pool_size, pool_size),
+        connection_pool_size=pool_size,
+        read_timeout=_env_float('TELEGRAM_READ_TIMEOUT', 5.0),
+        http_version="2" if http2_enabled() and not polling else "1.1",
+        proxy=proxy,
+    )
+
+
+async def prewarm_connections(openai_client=None, async_openai_client=None, bot=None,
+                              quiet: bool = False):
+    """Установка соединений заранее, чтобы первый запрос не ждал DNS и TLS.
+
+    Запросы прогрева ограничены коротким таймаутом без повторов, чтобы
+    недоступный сервис не задерживал запуск и не занимал потоки пула.
+    """
+    timeout = _env_float('NET_PREWARM_TIMEOUT', 5.0)
+    started = time.monotonic()
+    tasks = []
+    if async_openai_client is not None:
+        tasks.append(async_openai_client.with_options(timeout=timeout, max_retries=0).models.list())
+    if openai_client is not None:
+        tasks.append(asyncio.to_thread(
+            openai_client.with_options(timeout=timeout, max_retries=0).models.list
+        ))
+    if bot is not None:
+        tasks.append(bot.get_me(connect_timeout=timeout, read_timeout=timeout, pool_timeout=timeout))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Не удалось прогреть соединение: {str(result)}")
+    if not quiet:
+        logger.info(f"Соединения прогреты за {time.monotonic() - started:.2f}s: {get_connection_stats()}")
+
+
+async def keep_warm(interval: float, openai_client=None, async_openai_client=None, bot=None):
+    """Прогрев при запуске и затем периодически, чтобы соединения не закрывались при простое.
+
+    interval <= 0 - только однократный прогрев при запуске.
+    """
+    await prewarm_connections(openai_client, async_openai_client, bot)
+    while interval > 0:
+        await asyncio.sleep(interval)
+        await prewarm_connections(openai_client, async_openai_client, bot, quiet=True)
+        logger.debug(f"Статистика соединений: {get_connection_stats()}")
+
+
+def get_connection_stats() -> Dict[str, Dict[str, Any]]:
+    """Повторное использование соединений и TLS-рукопожатия по клиентам"""
+    return {
+        'openai': openai_stats.snapshot(),
+        'telegram': telegram_stats.snapshot(),
+    }
@@ -0,0 +1,132 @@
+import random
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from database import User, Session, db_session
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_bits(mask: int):
+    """Номера установленных битов маски"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ScenarioScheduler:
+    """Выбор сценария с учётом истории пользователя.
+
+    Каждому сценарию соответствует бит. Для пользователя хранятся две
+    битовые маски: пройденные сценарии и сценарии, в которых диагноз был
+    поставлен неверно. История загружается из базы один раз и далее
+    обновляется в памяти при завершении консультации, поэтому выбор
+    сценария не обращается к базе данных.
+    """
+
+    def __init__(self, scenarios: List[dict]):
+        self.scenarios = scenarios
+        self._bit: Dict[str, int] = {s['id']: index for index, s in enumerate(scenarios)}
+        self._difficulty_mask: Dict[str, int] = {}
+        for index, scenario in enumerate(scenarios):
+            difficulty = scenario['difficulty']
+            self._difficulty_mask[difficulty] = self._difficulty_mask.get(difficulty, 0) | (1 << index)
+        self._seen: Dict[int, int] = {}
+        self._weak: Dict[int, int] = {}
+        self._last: Dict[int, int] = {}
+        self._attempts = [0] * len(scenarios)
+        self._successes = [0] * len(scenarios)
+        self._lock = threading.Lock()
+
+    def load(self, chunk_size: int = 10000, owns_user: Optional[Callable[[int], bool]] = None):
+        """Загрузка истории консультаций из базы данных.
+
+        owns_user отбирает пользователей, чьи маски нужны этому процессу
+        (например, шарду); общая статистика сценариев учитывает всех.
+        """
+        try:
+            loaded = 0
+            with db_session() as session:
+                rows = (
+                    session.query(User.telegram_id, Session.scenario_id, Session.correct_diagnosis)
+                    .join(User, Session.user_id == User.id)
+                    .order_by(Session.id)
+                    .yield_per(chunk_size)
+                )
+                for telegram_id, scenario_id, correct in rows:
+                    if owns_user is None or owns_user(telegram_id):
+                        self.record(telegram_id, scenario_id, bool(correct))
+                        loaded += 1
+                    else:
+                        self._record_attempt(scenario_id, bool(correct))
+            logger.info(f"История сценариев загружена: {loaded} консультаций, {len(self._seen)} пользователей")
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке истории сценариев: {e}")
+
+    def record(self, user_id: int, scenario_id: str, correct: bool):
+        """Учёт завершённой консультации"""
+        index = self._bit.get(scenario_id)
+        if index is None:
+            return
+        bit = 1 << index
+        with self._lock:
+            self._seen[user_id] = self._seen.get(user_id, 0) | bit
+            if correct:
+                self._weak[user_id] = self._weak.get(user_id, 0) & ~bit
+            else:
+                self._weak[user_id] = self._weak.get(user_id, 0) | bit
+            self._attempts[index] += 1
+            self._successes[index] += int(correct)
+
+    def _record_attempt(self, scenario_id: str, correct: bool):
+        """Учёт консультации только в общей статистике сценария"""
+        index = self._bit.get(scenario_id)
+        if index is None:
+            return
+        with self._lock:
+            self._attempts[index] += 1
+            self._successes[index] += int(correct)
+
+    def success_rate(self, scenario_id: str) -> Optional[float]:
+        """Доля верных диагнозов по сценарию среди всех пользователей"""
+        index = self._bit.get(scenario_id)
+        if index is None or not self._attempts[index]:
+            return None
+        return self._successes[index] / self._attempts[index]
+
+    def pick(self, user_id: int, difficulty: str) -> dict:
+        """Выбор сценария: сначала непройденные, затем с ошибками, затем любые.
+
+        Среди непройденных предпочитаются сценарии с наименьшей общей
+        долей верных диагнозов; повтор предыдущего сценария избегается.
+        """
+        available = self._difficulty_mask.get(difficulty, 0)
+        if not available:
+            raise ValueError(f"Нет сценариев уровня {difficulty}")
+        with self._lock:
+            seen = self._seen.get(user_id, 0)
+            weak = self._weak.get(user_id, 0)
+            last = self._last.get(user_id)
+            not_last = available & ~(1 << last) if last is not None else available
+
+            unseen = available & ~seen
+            if unseen:
+                candidates = list(_iter_bits(unseen & not_last or unseen))
+                hardest = min(self._rate_or_default(i) for i in candidates)
+                candidates = [i for i in candidates if self._rate_or_default(i) == hardest]
+            elif weak & not_last:
+                candidates = list(_iter_bits(weak & not_last))
+            else:
+                candidates = list(_iter_bits(not_last or available))
+
+            index = random.choice(candidates)
+            self._last[user_id] = index
+        return self.scenarios[index]
+
+    def _rate_or_default(self, index: int) -> float:
+        # Сценарии без истории считаются сложными, чтобы они тоже попадали в выдачу
+        if not self._attempts[index]:
+            return 0.0
+        return self._successes[index] / self._attempts[index]
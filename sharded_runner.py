@@ -0,0 +1,271 @@
+import os
+import bisect
+import signal
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from typing import Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+from config import TelegramToken
+from network_clients import build_telegram_request
+
+logger = logging.getLogger(__name__)
+
+# Порядковый номер группы обработчика, считающего обработанные обновления
+STATS_HANDLER_GROUP = 1000
+
+
+class HashRing:
+    """Консистентное хеширование ключей по шардам.
+
+    Каждому шарду соответствует набор виртуальных узлов на кольце, поэтому
+    при изменении числа процессов переезжает лишь малая часть пользователей.
+    """
+
+    def __init__(self, shards: int, replicas: int = 128):
+        self._ring = sorted(
+            (self._hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def shard_for(self, key: int) -> int:
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._ring[index][1]
+
+
+def routing_key(update: Update) -> int:
+    """Ключ маршрутизации: пользователь, иначе чат, иначе само обновление"""
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return update.update_id
+
+
+def _share_resources(shards: int):
+    """Деление общих лимитов бота между шардами.
+
+    Переменные окружения задаются в родительском процессе до запуска
+    шардов: при spawn модули бота (и OutboundScheduler, и движки речи)
+    создаются при импорте главного модуля, ещё до _worker_main.
+    """
+    # Лимит Telegram на отправку действует на весь бот, а не на процесс
+    global_rate = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30))
+    os.environ['TELEGRAM_GLOBAL_RATE'] = str(global_rate / shards)
+    # Локальные движки речи делят ядра между шардами
+    cpus = int(os.environ.get('SPEECH_LOCAL_CPUS', 0)) or os.cpu_count() or 1
+    os.environ['SPEECH_LOCAL_CPUS'] = str(max(1, cpus // shards))
+
+
+def _worker_main(shard: int, shards: int, queue, processed):
+    """Точка входа рабочего процесса шарда"""
+    logging.basicConfig(
+        format=f'%(asctime)s - shard {shard} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    # Остановкой управляет родительский процесс через очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_serve_shard(shard, shards, queue, processed))
+
+
+async def _serve_shard(shard: int, shards: int, queue, processed):
+    from telegram.ext import TypeHandler
+    from bot_handlers import setup_bot, on_startup, on_stop, on_shutdown
+
+    application = setup_bot(with_updater=False)
+    # Шард хранит историю только пользователей, которых ему направляет родитель
+    ring = HashRing(shards)
+    application.bot_data['owns_user'] = lambda user_id: ring.shard_for(user_id) == shard
+
+    async def count_processed(update: Update, context):
+        with processed.get_lock():
+            processed[shard] += 1
+
+    application.add_handler(TypeHandler(Update, count_processed), group=STATS_HANDLER_GROUP)
+
+    loop = asyncio.get_running_loop()
+    async with application:
+        await on_startup(application)
+        await application.start()
+        logger.info(f"Шард {shard} запущен (pid {os.getpid()})")
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        # Плавная остановка: обрабатываем все уже принятые обновления
+        logger.info(f"Шард {shard} завершает обработку оставшихся обновлений...")
+        await application.stop()
+        await on_stop(application)
+        await on_shutdown(application)
+    logger.info(f"Шард {shard} остановлен")
+
+
+class ShardedRunner:
+    """Запуск бота в нескольких процессах с маршрутизацией по пользователю.
+
+    Родительский процесс получает обновления от Telegram и передаёт каждое
+    в процесс-шард, выбранный консистентным хешем effective_user.id, поэтому
+    состояние ConversationManager пользователя всегда находится в одном
+    процессе. SIGINT/SIGTERM - плавная остановка, SIGHUP - поочерёдный
+    перезапуск шардов. Состояние диалогов хранится в памяти шарда и при
+    его перезапуске теряется.
+    """
+
+    def __init__(self, workers: int, report_interval: float = 60.0, poll_timeout: int = 10,
+                 check_interval: float = 1.0):
+        self.workers = workers
+        self.report_interval = report_interval
+        self.check_interval = check_interval
+        self.poll_timeout = poll_timeout
+        self.ring = HashRing(workers)
+        self._mp = multiprocessing.get_context('spawn')
+        self._queues = [self._mp.Queue() for _ in range(workers)]
+        self._processed = self._mp.Array('q', workers)
+        self._routed = [0] * workers
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._stopping: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._restart_requested = False
+
+    def _start_worker(self, shard: int):
+        process = self._mp.Process(
+            target=_worker_main,
+            args=(shard, self.workers, self._queues[shard], self._processed),
+            name=f"bot-shard-{shard}",
+        )
+        process.start()
+        self._processes[shard] = process
+
+    async def _drain_worker(self, shard: int):
+        """Отправка сигнала остановки шарду и ожидание его завершения"""
+        process = self._processes[shard]
+        if process is None or not process.is_alive():
+            return
+        self._queues[shard].put(None)
+        await asyncio.get_running_loop().run_in_executor(None, process.join)
+
+    async def rolling_restart(self):
+        """Поочерёдный перезапуск шардов без потери поставленных в очередь обновлений"""
+        for shard in range(self.workers):
+            logger.info(f"Перезапуск шарда {shard}...")
+            await self._drain_worker(shard)
+            # Новый процесс продолжает читать ту же очередь
+            self._start_worker(shard)
+
+    def get_load(self) -> Dict[int, Dict[str, int]]:
+        """Нагрузка по шардам: направлено, обработано, в очереди"""
+        load = {}
+        for shard in range(self.workers):
+            process = self._processes[shard]
+            processed = self._processed[shard]
+            load[shard] = {
+                'routed': self._routed[shard],
+                'processed': processed,
+                'backlog': self._routed[shard] - processed,
+                'alive': bool(process and process.is_alive()),
+            }
+        return load
+
+    async def _poll(self, bot: Bot):
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset,
+                        timeout=self.poll_timeout,
+                        allowed_updates=Update.ALL_TYPES,
+                    )
+                except TelegramError as e:
+                    logger.warning(f"Ошибка получения обновлений: {str(e)}")
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    shard = self.ring.shard_for(routing_key(update))
+                    self._queues[shard].put(update.to_dict())
+                    self._routed[shard] += 1
+                    offset = update.update_id + 1
+        finally:
+            if offset is not None:
+                # Подтверждаем полученные обновления, чтобы Telegram не прислал их повторно
+                try:
+                    await bot.get_updates(offset=offset, timeout=0)
+                except TelegramError as e:
+                    logger.warning(f"Не удалось подтвердить обновления: {str(e)}")
+
+    async def _supervise(self):
+        """Перезапуск упавших шардов и периодический отчёт о нагрузке.
+
+        Живость процессов проверяется каждые check_interval секунд;
+        сигналы остановки и перезапуска будят супервизор сразу.
+        """
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            if self._restart_requested:
+                self._restart_requested = False
+                await self.rolling_restart()
+            for shard, process in enumerate(self._processes):
+                if not self._stopping.is_set() and process is not None and not process.is_alive():
+                    logger.error(f"Шард {shard} завершился с кодом {process.exitcode}, перезапуск")
+                    self._start_worker(shard)
+            if loop.time() >= next_report:
+                next_report = loop.time() + self.report_interval
+                logger.info(f"Нагрузка по шардам: {self.get_load()}")
+
+    def _request_stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _request_restart(self):
+        self._restart_requested = True
+        self._wakeup.set()
+        logger.info("Получен SIGHUP: шарды будут перезапущены")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        loop.add_signal_handler(signal.SIGINT, self._request_stop)
+        loop.add_signal_handler(signal.SIGTERM, self._request_stop)
+        loop.add_signal_handler(signal.SIGHUP, self._request_restart)
+
+        _share_resources(self.workers)
+        for shard in range(self.workers):
+            self._start_worker(shard)
+        logger.info(f"Запущено шардов: {self.workers}")
+
+        async with Bot(TelegramToken, get_updates_request=build_telegram_request(polling=True)) as bot:
+            poller = loop.create_task(self._poll(bot))
+            supervisor = loop.create_task(self._supervise())
+            await self._stopping.wait()
+            logger.info("Остановка: прекращаем получение обновлений")
+            poller.cancel()
+            await asyncio.gather(poller, supervisor, return_exceptions=True)
+
+        await asyncio.gather(*(self._drain_worker(shard) for shard in range(self.workers)))
+        logger.info(f"Все шарды остановлены. Итоговая нагрузка: {self.get_load()}")
+
+
+def run_sharded(workers: int):
+    """Запуск бота в workers процессах"""
+    asyncio.run(ShardedRunner(workers).run())
@@ -0,0 +1,183 @@
+import io
+import os
+import wave
+import asyncio
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Dict, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from speech_to_text import local_cpu_share
+
+logger = logging.getLogger(__name__)
+
+GENDERS = ('female', 'male', 'neutral')
+
+
+def normalize_gender(gender: Optional[str]) -> str:
+    """Приведение пола пациента к одному из поддерживаемых вариантов"""
+    return gender if gender in GENDERS else 'neutral'
+
+
+class SpeechSynthesisBackend:
+    """Базовый интерфейс движка синтеза речи.
+
+    synthesize возвращает аудио в формате OGG/Opus, готовое для send_voice.
+    """
+    name = "base"
+
+    async def start(self):
+        """Подготовка движка к работе (загрузка голосов, прогрев)"""
+
+    async def stop(self):
+        """Освобождение ресурсов движка"""
+
+    async def synthesize(self, text: str, gender: str) -> bytes:
+        raise NotImplementedError
+
+
+class OpenAITTSBackend(SpeechSynthesisBackend):
+    """Синтез речи через OpenAI TTS API"""
+    name = "openai"
+
+    # Определение голосов с основными вариантами для каждого пола
+    VOICES = {
+        'female': 'nova',     # Женский голос
+        'male': 'echo',       # Мужской голос
+        'neutral': 'alloy',   # Нейтральный голос
+    }
+
+    def __init__(self, client, model: str = "tts-1"):
+        self.client = client
+        self.model = model
+
+    def _synthesize_sync(self, text: str, voice: str) -> bytes:
+        response = self.client.audio.speech.create(
+            model=self.model,
+            voice=voice,
+            input=text,
+            response_format="opus",  # Используем формат opus, который лучше поддерживается
+            speed=1.0
+        )
+        if not response:
+            raise ValueError("No response received from TTS API")
+        if not hasattr(response, 'content'):
+            raise ValueError("Invalid response format from TTS API")
+        return response.content
+
+    async def synthesize(self, text: str, gender: str) -> bytes:
+        voice = self.VOICES[normalize_gender(gender)]
+        logger.info(f"Using voice: {voice} for gender: {gender}")
+        return await asyncio.to_thread(self._synthesize_sync, text, voice)
+
+
+# Голоса, загруженные в рабочем процессе локального движка
+_worker_voices: Dict[str, object] = {}
+
+
+def _init_worker(voice_paths: Dict[str, str]):
+    """Загрузка всех голосов один раз при старте рабочего процесса"""
+    from piper.voice import PiperVoice
+    loaded = {}
+    for gender, path in voice_paths.items():
+        if path not in loaded:
+            loaded[path] = PiperVoice.load(path)
+        _worker_voices[gender] = loaded[path]
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _synthesize_opus(text: str, gender: str, bitrate: str) -> bytes:
+    """Синтез речи и кодирование в OGG/Opus в рабочем процессе"""
+    from pydub import AudioSegment
+
+    voice = _worker_voices[gender]
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wav_file:
+        if hasattr(voice, 'synthesize_wav'):
+            voice.synthesize_wav(text, wav_file)
+        else:
+            voice.synthesize(text, wav_file)
+    wav_buffer.seek(0)
+
+    opus_buffer = io.BytesIO()
+    AudioSegment.from_wav(wav_buffer).export(
+        opus_buffer, format="ogg", codec="libopus", bitrate=bitrate
+    )
+    return opus_buffer.getvalue()
+
+
+class LocalTTSBackend(SpeechSynthesisBackend):
+    """Локальный синтез речи на CPU (Piper, ONNX-модели голосов).
+
+    Голоса для каждого пола загружаются заранее в каждом процессе пула,
+    поэтому ответы синтезируются параллельно без обращения к сети.
+    """
+    name = "local"
+
+    def __init__(self, voice_paths: Dict[str, str], workers: int = 0, bitrate: str = "32k"):
+        missing = [g for g in GENDERS if g not in voice_paths]
+        if missing:
+            raise ValueError(f"Не заданы голоса для: {', '.join(missing)}")
+        self.voice_paths = voice_paths
+        self.workers = workers or os.cpu_count() or 1
+        self.bitrate = bitrate
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def start(self):
+        if self._executor is not None:
+            return
+        loop = asyncio.get_running_loop()
+        # spawn: fork копирует блокировки уже работающих потоков процесса бота
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.voice_paths,),
+        )
+        # Прогрев: запускаем все процессы и дожидаемся загрузки голосов
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _worker_ready)
+            for _ in range(self.workers)
+        ))
+        logger.info(f"Локальный движок синтеза речи запущен: процессов {len(set(pids))}")
+
+    async def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def synthesize(self, text: str, gender: str) -> bytes:
+        if self._executor is None:
+            await self.start()
+        gender = normalize_gender(gender)
+        logger.info(f"Using local voice {Path(self.voice_paths[gender]).name} for gender: {gender}")
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, _synthesize_opus, text, gender, self.bitrate
+        )
+
+
+def create_tts_backend(client) -> SpeechSynthesisBackend:
+    """Создание движка синтеза речи по переменной окружения TTS_BACKEND"""
+    backend = os.environ.get('TTS_BACKEND', 'openai').lower()
+    if backend == 'local':
+        voices_dir = Path(os.environ.get('TTS_LOCAL_VOICES_DIR', 'data/voices'))
+        defaults = {
+            'female': 'en_US-amy-medium.onnx',
+            'male': 'en_US-ryan-medium.onnx',
+            'neutral': 'en_US-lessac-medium.onnx',
+        }
+        voice_paths = {
+            gender: str(voices_dir / os.environ.get(f'TTS_LOCAL_VOICE_{gender.upper()}', default))
+            for gender, default in defaults.items()
+        }
+        return LocalTTSBackend(
+            voice_paths,
+            workers=int(os.environ.get('TTS_LOCAL_WORKERS', 0)) or local_cpu_share(),
+        )
+    if backend != 'openai':
+        logger.warning(f"Неизвестный движок синтеза речи '{backend}', используется OpenAI TTS")
+    return OpenAITTSBackend(client)
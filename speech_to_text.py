@@ -0,0 +1,200 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def local_cpu_share() -> int:
+    """Ядра, доступные одному локальному движку речи.
+
+    SPEECH_LOCAL_CPUS ограничивает общее число ядер (по умолчанию все);
+    если локально работают и распознавание, и синтез речи, ядра делятся
+    между ними поровну.
+    """
+    cpus = int(os.environ.get('SPEECH_LOCAL_CPUS', 0)) or os.cpu_count() or 1
+    engines = sum(
+        os.environ.get(name, 'openai').lower() == 'local'
+        for name in ('STT_BACKEND', 'TTS_BACKEND')
+    )
+    return max(1, cpus // max(1, engines))
+
+
+class SpeechToTextBackend:
+    """Базовый интерфейс движка распознавания речи"""
+    name = "base"
+
+    async def start(self):
+        """Подготовка движка к работе (загрузка моделей, прогрев)"""
+
+    async def stop(self):
+        """Освобождение ресурсов движка"""
+
+    async def transcribe(self, path: Path) -> str:
+        raise NotImplementedError
+
+
+class OpenAIWhisperBackend(SpeechToTextBackend):
+    """Распознавание через OpenAI Whisper API"""
+    name = "openai"
+
+    def __init__(self, client, model: str = "whisper-1"):
+        self.client = client
+        self.model = model
+
+    def _transcribe_sync(self, path: Path) -> str:
+        with open(path, "rb") as audio_file:
+            return self.client.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                response_format="text"
+            )
+
+    async def transcribe(self, path: Path) -> str:
+        return await asyncio.to_thread(self._transcribe_sync, path)
+
+
+# Состояние рабочего процесса локального движка
+_worker_model = None
+
+
+def _init_worker(model_name: str, compute_type: str, cpu_threads: int):
+    """Загрузка модели один раз при старте рабочего процесса"""
+    global _worker_model
+    from faster_whisper import WhisperModel
+    _worker_model = WhisperModel(
+        model_name,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+    )
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _transcribe_file(path: str, language: Optional[str]) -> str:
+    """Распознавание записи в рабочем процессе"""
+    segments, _ = _worker_model.transcribe(path, language=language, beam_size=1)
+    return " ".join(segment.text.strip() for segment in segments)
+
+
+class LocalWhisperBackend(SpeechToTextBackend):
+    """Локальное распознавание на CPU (faster-whisper / CTranslate2).
+
+    Модель загружается в каждом рабочем процессе пула при старте. Записи
+    передаются в пул по одной и только при наличии свободного процесса:
+    пока запись ждёт в очереди, вызывающий может отказаться от неё по
+    таймауту, и тогда она не распознаётся зря.
+    """
+    name = "local"
+
+    def __init__(self, model_name: str = "small", workers: int = 0, cpus: int = 0,
+                 compute_type: str = "int8", language: Optional[str] = "en"):
+        self.model_name = model_name
+        self.cpus = cpus or os.cpu_count() or 1
+        self.workers = workers or self.cpus
+        self.compute_type = compute_type
+        self.language = language
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._idle: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    async def start(self):
+        if self._executor is not None:
+            return
+        loop = asyncio.get_running_loop()
+        cpu_threads = max(1, self.cpus // self.workers)
+        # spawn: к моменту старта в процессе уже работают потоки, а fork
+        # копирует их блокировки (например, блокировки logging)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.compute_type, cpu_threads),
+        )
+        # Прогрев: запускаем все процессы и дожидаемся загрузки модели
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _worker_ready)
+            for _ in range(self.workers)
+        ))
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Semaphore(self.workers)
+        self._dispatcher = loop.create_task(self._dispatch())
+        logger.info(
+            f"Локальный движок распознавания запущен: модель {self.model_name}, "
+            f"процессов {len(set(pids))}"
+        )
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def transcribe(self, path: Path) -> str:
+        if self._queue is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((str(path), future))
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._idle.acquire()
+            try:
+                path, future = await self._queue.get()
+                # Вызывающий уже отказался от записи (таймаут или отмена)
+                while future.done():
+                    path, future = await self._queue.get()
+            except asyncio.CancelledError:
+                self._idle.release()
+                raise
+            task = loop.create_task(self._run(path, future))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, path: str, future: asyncio.Future):
+        try:
+            text = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _transcribe_file, path, self.language
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Ошибка локального распознавания: {str(e)}"))
+        else:
+            if not future.done():
+                future.set_result(text)
+        finally:
+            self._idle.release()
+
+
+def create_stt_backend(client) -> SpeechToTextBackend:
+    """Создание движка распознавания по переменной окружения STT_BACKEND"""
+    backend = os.environ.get('STT_BACKEND', 'openai').lower()
+    if backend == 'local':
+        return LocalWhisperBackend(
+            model_name=os.environ.get('STT_LOCAL_MODEL', 'small'),
+            workers=int(os.environ.get('STT_LOCAL_WORKERS', 0)),
+            cpus=local_cpu_share(),
+            compute_type=os.environ.get('STT_LOCAL_COMPUTE_TYPE', 'int8'),
+        )
+    if backend != 'openai':
+        logger.warning(f"Неизвестный движок распознавания '{backend}', используется OpenAI Whisper")
+    return OpenAIWhisperBackend(client)
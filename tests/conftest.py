@@ -0,0 +1,19 @@
+import os
+import sys
+import types
+import importlib.util
+from pathlib import Path
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Тесты не ходят во внешние сервисы: база в памяти, а config.py с
+# секретами (его нет в репозитории) заменяется пустыми значениями
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+if importlib.util.find_spec('config') is None:
+    config = types.ModuleType('config')
+    config.TelegramToken = 'test-token'
+    config.OpenAIkey = 'test-key'
+    config.http_proxy = config.https_proxy = None
+    config.host = config.user = config.password = config.database = config.port = None
+    sys.modules['config'] = config
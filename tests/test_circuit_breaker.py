@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+from llm_providers import DeadlineExceeded
+
+
+async def hang():
+    await asyncio.Event().wait()
+
+
+async def call_with_budget(breaker: CircuitBreaker, func, budget: float):
+    # Так же, как generate_response: таймаут - остаток дедлайна хода
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    await asyncio.sleep(0.001)
+    return await breaker.call(func, timeout=deadline - loop.time())
+
+
+def test_opens_when_deadline_equals_call_timeout():
+    breaker = CircuitBreaker('chat', call_timeout=0.1, failure_threshold=3)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(TimeoutError):
+                await call_with_budget(breaker, hang, budget=0.1)
+        with pytest.raises(CircuitOpenError):
+            await call_with_budget(breaker, hang, budget=0.1)
+
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
+
+
+def test_opens_when_inner_deadline_fires_first():
+    breaker = CircuitBreaker('chat', call_timeout=0.2, failure_threshold=3)
+
+    async def router_with_deadline():
+        await asyncio.sleep(0.05)
+        raise DeadlineExceeded("не ответил в пределах дедлайна")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(TimeoutError):
+                await call_with_budget(breaker, router_with_deadline, budget=0.15)
+
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
+
+
+def test_short_caller_budget_is_not_a_failure():
+    breaker = CircuitBreaker('chat', call_timeout=1.0, failure_threshold=1)
+
+    async def scenario():
+        with pytest.raises(TimeoutError):
+            await call_with_budget(breaker, hang, budget=0.05)
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED
+    assert breaker.health()['consecutive_failures'] == 0
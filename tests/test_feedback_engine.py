@@ -0,0 +1,95 @@
+import pytest
+
+from feedback_engine import FeedbackEngine
+
+# Подсказки в стиле сценариев, не зависящие от data/medical_scenarios.json
+HINTS = [
+    "Check blood pressure",
+    "Ask about family history of hypertension",
+    "Check family history of diabetes",
+    "Check for difficulty swallowing",
+    "Ask about eating and drinking habits",
+    "Check for triggers like physical activity or stress",
+    "Ask about pain location",
+    "Ask about pain timing related to meals",
+    "Inquire about visual symptoms",
+    "Check for fever",
+    "Ask about nausea or vomiting",
+    "Check for numbness in extremities",
+]
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return FeedbackEngine([{'id': 'case', 'hints': HINTS}])
+
+
+def covered(engine, question):
+    mask = engine.match_question('case', question)
+    return {hint for i, hint in enumerate(HINTS) if mask >> i & 1}
+
+
+@pytest.mark.parametrize('question, hint', [
+    ("What is your blood pressure?", "Check blood pressure"),
+    ("Does your father have high blood pressure?", "Check blood pressure"),
+    ("Does your father have high blood pressure?", "Ask about family history of hypertension"),
+    ("Does anyone in your family have diabetes?", "Check family history of diabetes"),
+    ("Do you have diabetes?", "Check family history of diabetes"),
+    ("Is it hard to swallow?", "Check for difficulty swallowing"),
+    ("Do you feel thirsty a lot?", "Ask about eating and drinking habits"),
+    ("What do you usually eat?", "Ask about eating and drinking habits"),
+    ("Are you stressed?", "Check for triggers like physical activity or stress"),
+    ("Does it get worse when you climb stairs?", "Check for triggers like physical activity or stress"),
+    ("Where exactly is the pain?", "Ask about pain location"),
+    ("Does the pain come on after meals?", "Ask about pain timing related to meals"),
+    ("Is your vision blurry?", "Inquire about visual symptoms"),
+    ("Have you had a temperature?", "Check for fever"),
+    ("Any chills or shivering?", "Check for fever"),
+    ("Have you been vomiting?", "Ask about nausea or vomiting"),
+    ("Do you feel nauseous?", "Ask about nausea or vomiting"),
+    ("Any tingling in your fingers?", "Check for numbness in extremities"),
+    ("Do you feel numb anywhere?", "Check for numbness in extremities"),
+])
+def test_question_covers_hint(engine, question, hint):
+    assert hint in covered(engine, question)
+
+
+@pytest.mark.parametrize('question, hint', [
+    ("What about your blood sugar?", "Check blood pressure"),
+    ("Any family history of heart disease?", "Check family history of diabetes"),
+    ("Any family history of heart disease?", "Ask about family history of hypertension"),
+    ("Any difficulty breathing?", "Check for difficulty swallowing"),
+    ("When did the pain start?", "Ask about pain location"),
+    ("When did the pain start?", "Ask about pain timing related to meals"),
+    ("Let me see.", "Inquire about visual symptoms"),
+    ("Have you been vomiting?", "Check for fever"),
+])
+def test_question_does_not_cover_hint(engine, question, hint):
+    assert hint not in covered(engine, question)
+
+
+@pytest.mark.parametrize('question', [
+    "Hello, how are you today?",
+    "Tell me more.",
+    "Do you have any history?",
+])
+def test_small_talk_covers_nothing(engine, question):
+    assert covered(engine, question) == set()
+
+
+def test_missed_hints_follow_coverage():
+    engine = FeedbackEngine([{'id': 'throat', 'hints': [
+        "Ask about fever", "Check for difficulty swallowing", "Ask about cough",
+    ]}])
+    mask = engine.match_question('throat', "Do you have a fever?")
+    mask |= engine.match_question('throat', "Any difficulty breathing?")
+    assert engine.missed_hints('throat', mask) == (
+        "Check for difficulty swallowing",
+        "Ask about cough",
+    )
+
+
+def test_unknown_scenario_has_no_feedback(engine):
+    assert engine.match_question('missing', "Do you have a fever?") == 0
+    assert engine.missed_hints('missing', 0) == ()
+    assert engine.glossary('missing') is None
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from llm_providers import DeadlineExceeded, HedgingPolicy, LLMRouter
+
+
+class FakeProvider:
+    """Провайдер с заданными по очереди задержками и ошибками"""
+
+    def __init__(self, name, delays, error=None):
+        self.name = name
+        self.delays = list(delays)
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, messages, model, max_tokens, timeout=None):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return f"{self.name}:{model}"
+
+
+def make_router(providers, route, **hedging):
+    return LLMRouter(
+        {provider.name: provider for provider in providers},
+        {'default': route},
+        HedgingPolicy(report_interval=0, **hedging),
+    )
+
+
+def warm_up(policy, key, latency, count=20):
+    for _ in range(count):
+        policy.record_latency(key, latency)
+
+
+def test_falls_back_to_next_provider():
+    broken = FakeProvider('broken', [0], error=RuntimeError('boom'))
+    spare = FakeProvider('spare', [0])
+    router = make_router([broken, spare], [('broken', 'm1'), ('spare', 'm2')])
+
+    assert asyncio.run(router.complete([])) == 'spare:m2'
+    assert broken.calls == 1 and spare.calls == 1
+
+
+def test_deadline_stops_route():
+    slow = FakeProvider('slow', [1.0])
+    spare = FakeProvider('spare', [0])
+    router = make_router([slow, spare], [('slow', 'm1'), ('spare', 'm2')])
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        with pytest.raises(DeadlineExceeded):
+            await router.complete([], deadline=loop.time() + 0.05)
+
+    asyncio.run(scenario())
+    assert slow.cancelled == 1
+    assert spare.calls == 0
+
+
+def test_hedge_wins_and_primary_is_cancelled():
+    # Первый запрос зависает, дубликат отвечает быстро
+    provider = FakeProvider('p', [1.0, 0.01])
+    router = make_router([provider], [('p', 'm')], min_delay=0.05, max_rate=1.0)
+    warm_up(router.hedging, ('p', 'm'), 0.05)
+
+    assert asyncio.run(router.complete([])) == 'p:m'
+    assert provider.calls == 2
+    assert provider.cancelled == 1
+    stats = router.get_stats()
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+    # Задержка дубликата считается от его собственного запуска
+    assert router.hedging._latencies[('p', 'm')][-1] < 0.05
+
+
+def test_suppressed_only_when_hedge_would_fire():
+    provider = FakeProvider('p', [0.0])
+    router = make_router([provider], [('p', 'm')], min_delay=0.05, max_rate=0.0)
+    warm_up(router.hedging, ('p', 'm'), 0.05)
+    router.hedging.record_request(hedged=True)
+
+    asyncio.run(router.complete([]))
+    assert router.get_stats().get('hedges_suppressed', 0) == 0
+
+    provider.delays = [0.1]
+    asyncio.run(router.complete([]))
+    assert router.get_stats()['hedges_suppressed'] == 1
+    assert provider.calls == 2
@@ -0,0 +1,131 @@
+import time
+import asyncio
+
+from message_scheduler import OutboundScheduler, COALESCE_SEPARATOR
+
+
+class FakeBot:
+    def __init__(self, log):
+        self.log = log
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.log.append(('text', chat_id, text))
+        return f"message:{len(self.log)}"
+
+
+class FakeMessage:
+    def __init__(self, log, chat_id=1):
+        self.log = log
+        self.chat_id = chat_id
+
+    async def delete(self):
+        self.log.append(('delete', self.chat_id))
+        return True
+
+    async def edit_text(self, text, reply_markup=None):
+        self.log.append(('edit', self.chat_id, text))
+        return True
+
+
+def test_consecutive_texts_are_coalesced():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler()
+        bot = FakeBot(log)
+        futures = [scheduler.send_text(bot, 1, text) for text in ("one", "two", "three")]
+        results = await asyncio.gather(*futures)
+        assert len(set(results)) == 1
+        assert scheduler.get_stats()['coalesced'] == 2
+
+    asyncio.run(scenario())
+    assert log == [('text', 1, COALESCE_SEPARATOR.join(("one", "two", "three")))]
+
+
+def test_text_with_markup_ends_the_coalesced_message():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler()
+        bot = FakeBot(log)
+        first = scheduler.send_text(bot, 1, "one", reply_markup="keyboard")
+        second = scheduler.send_text(bot, 1, "two")
+        await asyncio.gather(first, second)
+
+    asyncio.run(scenario())
+    assert [entry[2] for entry in log] == ["one", "two"]
+
+
+def test_replies_go_before_cosmetic_operations():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler()
+        bot = FakeBot(log)
+        deleted = scheduler.delete(FakeMessage(log))
+        replied = scheduler.send_text(bot, 1, "answer")
+        await asyncio.gather(deleted, replied)
+
+    asyncio.run(scenario())
+    assert [entry[0] for entry in log] == ['text', 'delete']
+
+
+def test_chat_rate_limit_spaces_out_sends():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler(chat_rate=20, chat_burst=1)
+        bot = FakeBot(log)
+        started = time.monotonic()
+        await scheduler.send_text(bot, 1, "first")
+        await scheduler.send_text(bot, 1, "second")
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    assert len(log) == 2
+    assert elapsed >= 0.04
+
+
+def test_cosmetic_operation_completes_at_low_global_rate():
+    log = []
+
+    async def scenario():
+        # Лимит одного из 26 шардов при общем лимите 30 сообщений в секунду
+        scheduler = OutboundScheduler(global_rate=30 / 26)
+        await asyncio.wait_for(scheduler.delete(FakeMessage(log)), timeout=1)
+        await asyncio.wait_for(scheduler.delete(FakeMessage(log)), timeout=2)
+
+    asyncio.run(scenario())
+    assert log == [('delete', 1), ('delete', 1)]
+
+
+def test_waiting_cosmetic_operation_does_not_block_reply():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler(global_rate=10, chat_rate=100, chat_burst=100)
+        scheduler.global_bucket.tokens = 0
+        bot = FakeBot(log)
+        # Удалению нужен токен и резерв (0.3s), ответу - только токен (0.1s)
+        deleted = scheduler.delete(FakeMessage(log))
+        await asyncio.sleep(0.02)
+        replied = scheduler.send_text(bot, 1, "answer")
+        await asyncio.gather(deleted, replied)
+
+    asyncio.run(scenario())
+    assert [entry[0] for entry in log] == ['text', 'delete']
+
+
+def test_stop_waits_for_queued_operations():
+    log = []
+
+    async def scenario():
+        scheduler = OutboundScheduler(chat_rate=50, chat_burst=1)
+        scheduler.delete(FakeMessage(log))
+        scheduler.delete(FakeMessage(log, chat_id=2))
+        scheduler.edit_text(FakeMessage(log), "done")
+        await scheduler.stop()
+        assert scheduler.get_stats()['queued'] == 0
+
+    asyncio.run(scenario())
+    assert sorted(entry[0] for entry in log) == ['delete', 'delete', 'edit']
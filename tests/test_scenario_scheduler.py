@@ -0,0 +1,77 @@
+from database import User, Session, db_session
+from scenario_scheduler import ScenarioScheduler
+
+SCENARIOS = [
+    {'id': 'flu', 'difficulty': 'beginner'},
+    {'id': 'migraine', 'difficulty': 'beginner'},
+]
+
+
+def add_history(rows):
+    with db_session() as session:
+        session.query(Session).delete()
+        session.query(User).delete()
+        users = {}
+        for telegram_id, scenario_id, correct in rows:
+            if telegram_id not in users:
+                users[telegram_id] = User(telegram_id=telegram_id)
+                session.add(users[telegram_id])
+                session.flush()
+            session.add(Session(user_id=users[telegram_id].id, scenario_id=scenario_id,
+                                correct_diagnosis=correct))
+        session.commit()
+
+
+def test_load_keeps_only_owned_users():
+    add_history([(1, 'flu', True), (2, 'flu', False), (2, 'migraine', True)])
+    scheduler = ScenarioScheduler(SCENARIOS)
+    scheduler.load(owns_user=lambda user_id: user_id == 1)
+
+    assert set(scheduler._seen) == {1}
+    # Общая статистика сценариев учитывает всех пользователей
+    assert scheduler.success_rate('flu') == 0.5
+    assert scheduler.success_rate('migraine') == 1.0
+
+
+def make_scheduler():
+    return ScenarioScheduler([
+        {'id': 'flu', 'difficulty': 'beginner'},
+        {'id': 'migraine', 'difficulty': 'beginner'},
+        {'id': 'asthma', 'difficulty': 'beginner'},
+        {'id': 'stroke', 'difficulty': 'advanced'},
+    ])
+
+
+def test_unseen_first_hardest_first():
+    scheduler = make_scheduler()
+    # Остальные пользователи чаще ошибаются в мигрени
+    scheduler.record(100, 'flu', True)
+    scheduler.record(100, 'migraine', False)
+    scheduler.record(100, 'asthma', True)
+    scheduler.record(1, 'asthma', True)
+
+    assert scheduler.pick(1, 'beginner')['id'] == 'migraine'
+
+
+def test_weak_scenarios_after_unseen():
+    scheduler = make_scheduler()
+    scheduler.record(1, 'flu', True)
+    scheduler.record(1, 'migraine', False)
+    scheduler.record(1, 'asthma', True)
+
+    assert scheduler.pick(1, 'beginner')['id'] == 'migraine'
+
+
+def test_does_not_repeat_last_scenario():
+    scheduler = make_scheduler()
+    for scenario_id in ('flu', 'migraine', 'asthma'):
+        scheduler.record(1, scenario_id, True)
+
+    picks = [scheduler.pick(1, 'beginner')['id'] for _ in range(20)]
+    assert all(a != b for a, b in zip(picks, picks[1:]))
+
+
+def test_filters_by_difficulty():
+    scheduler = make_scheduler()
+    assert scheduler.pick(1, 'advanced')['id'] == 'stroke'
+    assert scheduler.pick(1, 'advanced')['id'] == 'stroke'
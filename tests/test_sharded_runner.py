@@ -0,0 +1,22 @@
+from sharded_runner import HashRing
+
+
+def test_same_key_same_shard():
+    ring = HashRing(4)
+    assert [ring.shard_for(key) for key in range(1000)] == [HashRing(4).shard_for(key) for key in range(1000)]
+
+
+def test_all_shards_used():
+    ring = HashRing(4)
+    counts = [0] * 4
+    for key in range(10000):
+        counts[ring.shard_for(key)] += 1
+    assert min(counts) > 10000 / 4 / 2
+
+
+def test_adding_shard_moves_few_keys():
+    before, after = HashRing(4), HashRing(5)
+    moved = [key for key in range(10000) if before.shard_for(key) != after.shard_for(key)]
+    # Переезжают только ключи, доставшиеся новому шарду (около 1/5)
+    assert all(after.shard_for(key) == 4 for key in moved)
+    assert len(moved) < 10000 * 0.3
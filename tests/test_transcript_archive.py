@@ -0,0 +1,20 @@
+from transcript_archive import decode_turns, encode_turns
+
+
+def test_round_trip():
+    turns = [
+        {'role': 'student', 'text': 'Where does it hurt?', 'ts': 1700000000.5},
+        {'role': 'patient', 'text': 'Здесь, в груди 💔', 'ts': 1700000003.25},
+        {'role': 'student', 'text': '', 'ts': None},
+    ]
+    assert decode_turns(encode_turns(turns)) == turns
+
+
+def test_missing_fields_become_none():
+    assert decode_turns(encode_turns([{'role': 'student'}])) == [
+        {'role': 'student', 'text': None, 'ts': None}
+    ]
+
+
+def test_empty():
+    assert decode_turns(encode_turns([])) == []
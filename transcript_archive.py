@@ -0,0 +1,247 @@
+import csv
+import sys
+import json
+import zlib
+import queue
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import Transcript, Session, User, db_session
+
+logger = logging.getLogger(__name__)
+
+# Формат хранения: колонки role/text/ts в JSON, сжатые zlib
+CODEC = 'json-columns+zlib'
+COLUMNS = ('role', 'text', 'ts')
+
+
+def encode_turns(turns: List[Dict[str, Any]]) -> bytes:
+    """Упаковка реплик в колоночный формат и сжатие.
+
+    Одинаковые значения (роли, близкие метки времени) в колонках идут
+    подряд, поэтому сжимаются заметно лучше, чем список объектов.
+    """
+    columns = {name: [turn.get(name) for turn in turns] for name in COLUMNS}
+    payload = json.dumps(columns, ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'), 9)
+
+
+def decode_turns(data: bytes) -> List[Dict[str, Any]]:
+    """Распаковка реплик, сохранённых encode_turns"""
+    columns = json.loads(zlib.decompress(data).decode('utf-8'))
+    return [dict(zip(COLUMNS, values)) for values in zip(*(columns[name] for name in COLUMNS))]
+
+
+class TranscriptArchive:
+    """Фоновая запись расшифровок консультаций.
+
+    append только ставит расшифровку в очередь; сжатие и запись в базу
+    выполняются пакетами в отдельном потоке, вне обработчиков Telegram.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def append(self, session_id: int, turns: List[Dict[str, Any]]):
+        """Постановка расшифровки консультации в очередь на запись"""
+        if not turns:
+            return
+        self._ensure_started()
+        self._queue.put((session_id, list(turns)))
+
+    def stop(self):
+        """Запись всех расшифровок из очереди и остановка потока"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='transcript-archive', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                stopping = True
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[Tuple[int, List[Dict[str, Any]]]]):
+        try:
+            with db_session() as session:
+                for session_id, turns in batch:
+                    session.add(Transcript(
+                        session_id=session_id,
+                        codec=CODEC,
+                        turn_count=len(turns),
+                        data=encode_turns(turns),
+                    ))
+                session.commit()
+            logger.debug(f"Записано расшифровок: {len(batch)}")
+        except Exception as e:
+            logger.error(f"Ошибка при записи расшифровок консультаций: {str(e)}")
+
+
+# Глобальный архив для использования в приложении
+transcript_archive = TranscriptArchive()
+
+
+def iter_transcripts(since: Optional[datetime] = None, difficulty: Optional[str] = None,
+                     chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Потоковое чтение расшифровок.
+
+    Использует серверный курсор (yield_per), поэтому в памяти находится
+    не больше chunk_size строк одновременно.
+    """
+    with db_session() as session:
+        query = (
+            session.query(Transcript, Session, User.telegram_id)
+            .join(Session, Transcript.session_id == Session.id)
+            .join(User, Session.user_id == User.id)
+            .order_by(Transcript.id)
+        )
+        if since is not None:
+            query = query.filter(Transcript.created_at >= since)
+        if difficulty is not None:
+            query = query.filter(Session.difficulty == difficulty)
+
+        for transcript, consultation, telegram_id in query.yield_per(chunk_size):
+            yield {
+                'session_id': consultation.id,
+                'telegram_id': telegram_id,
+                'scenario_id': consultation.scenario_id,
+                'difficulty': consultation.difficulty,
+                'correct_diagnosis': consultation.correct_diagnosis,
+                'questions_asked': consultation.questions_asked,
+                'created_at': consultation.created_at.isoformat() if consultation.created_at else None,
+                'turns': decode_turns(transcript.data),
+            }
+
+
+def export_jsonl(out, **filters) -> int:
+    """Выгрузка в JSON Lines: одна консультация на строку"""
+    count = 0
+    for record in iter_transcripts(**filters):
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write('\n')
+        count += 1
+    return count
+
+
+CSV_FIELDS = ('session_id', 'telegram_id', 'scenario_id', 'difficulty', 'correct_diagnosis',
+              'turn_index', 'role', 'text', 'ts')
+
+
+def _iter_turn_rows(**filters) -> Iterator[Dict[str, Any]]:
+    for record in iter_transcripts(**filters):
+        for index, turn in enumerate(record['turns']):
+            yield {
+                'session_id': record['session_id'],
+                'telegram_id': record['telegram_id'],
+                'scenario_id': record['scenario_id'],
+                'difficulty': record['difficulty'],
+                'correct_diagnosis': record['correct_diagnosis'],
+                'turn_index': index,
+                'role': turn['role'],
+                'text': turn['text'],
+                'ts': turn['ts'],
+            }
+
+
+def export_csv(out, **filters) -> int:
+    """Выгрузка в CSV: одна реплика на строку"""
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    count = 0
+    for row in _iter_turn_rows(**filters):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def export_parquet(path: str, row_group_size: int = 50000, **filters) -> int:
+    """Выгрузка в Parquet (нужен pyarrow): одна реплика на строку, запись группами строк"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Для выгрузки в Parquet установите пакет pyarrow")
+
+    schema = pa.schema([
+        ('session_id', pa.int64()),
+        ('telegram_id', pa.int64()),
+        ('scenario_id', pa.string()),
+        ('difficulty', pa.string()),
+        ('correct_diagnosis', pa.bool_()),
+        ('turn_index', pa.int32()),
+        ('role', pa.string()),
+        ('text', pa.string()),
+        ('ts', pa.float64()),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        rows = []
+        for row in _iter_turn_rows(**filters):
+            rows.append(row)
+            if len(rows) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            count += len(rows)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка расшифровок консультаций")
+    parser.add_argument('format', choices=('jsonl', 'csv', 'parquet'))
+    parser.add_argument('--output', '-o', help="Файл для выгрузки (для jsonl/csv по умолчанию stdout)")
+    parser.add_argument('--since', type=datetime.fromisoformat, help="Только консультации с даты (ISO 8601)")
+    parser.add_argument('--difficulty', choices=('beginner', 'intermediate', 'advanced'))
+    args = parser.parse_args()
+
+    filters = {'since': args.since, 'difficulty': args.difficulty}
+    if args.format == 'parquet':
+        if not args.output:
+            parser.error("Для формата parquet укажите --output")
+        count = export_parquet(args.output, **filters)
+    else:
+        export = export_jsonl if args.format == 'jsonl' else export_csv
+        if args.output:
+            with open(args.output, 'w', newline='', encoding='utf-8') as out:
+                count = export(out, **filters)
+        else:
+            count = export(sys.stdout, **filters)
+    logger.info(f"Выгружено записей: {count}")
+
+
+if __name__ == '__main__':
+    main()